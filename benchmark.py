@@ -0,0 +1,272 @@
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import numpy as np
+
+# benchmarks the simulation and training hot paths of both games. Every case is seeded, so runs on the same machine
+# do the same work and can be compared against a saved baseline to catch performance regressions.
+# usage: python3 benchmark.py [--output results.json] [--baseline baseline.json] [--save-baseline baseline.json]
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# both games have their own nn.py, so each game's modules are imported with its directory first on the path and then
+# removed from sys.modules before the other game's are imported
+sys.path.insert(0, os.path.join(ROOT, 'pong'))
+import nn as pong_nn
+import ai_pong
+sys.path.pop(0)
+# every pong module with the same name as a flappy bird module (nn, spectator, ...). The rest stay importable, so pool
+# tasks can still pickle ai_pong's functions.
+for file in os.listdir(os.path.join(ROOT, 'flappy_bird')):
+    if file.endswith('.py'):
+        sys.modules.pop(file[:-3], None)
+sys.path.insert(0, os.path.join(ROOT, 'flappy_bird'))
+import nn as flappy_nn
+import headless_flappy_bird
+sys.path.pop(0)
+sys.modules.pop('nn', None)
+
+np.seterr(over='ignore')  # the sigmoid overflows to exactly 0 or 1 for large inputs, which is expected
+
+SEED = 0  # seed of every random number generator used by the benchmarks
+WARMUP = 1  # untimed runs of every case before measuring
+REPEATS = 5  # timed runs of every case
+THRESHOLD = .1  # a case regressed if its median is this much slower than the baseline's
+TRIAL_AGENTS = 1000  # networks playing each vectorized pong trial
+SCALAR_TRIAL_AGENTS = 100  # networks playing each do_trial call, which is much slower
+GENERATION_AGENTS = 200  # networks in the benchmarked pong generation
+GENERATION_TRIALS = 20  # trials in the benchmarked pong generation
+FLAPPY_BIRDS = 1000  # birds in the flappy bird benchmark
+FLAPPY_FRAMES = 60  # one second of frames at the 60 FPS ai_flappy_bird.py runs at
+
+
+def seed(value: int = SEED):
+    """Seeds the random module and numpy's global generator."""
+    random.seed(value)
+    np.random.seed(value)
+
+
+def measure(case, warmup: int = WARMUP, repeats: int = REPEATS) -> dict:
+    """Times a benchmark case.
+
+    Args:
+        case (function): called with no arguments, it sets up the case (untimed) and returns the function to time
+        warmup (int, optional): untimed runs before measuring. Defaults to WARMUP.
+        repeats (int, optional): timed runs. Defaults to REPEATS.
+
+    Returns:
+        dict: min, median, mean and standard deviation of the timed runs in seconds
+    """
+    times = []
+    for i in range(warmup + repeats):
+        seed()
+        run = case()
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        if i >= warmup:
+            times.append(elapsed)
+    return {'min': min(times), 'median': statistics.median(times), 'mean': statistics.mean(times),
+            'stdev': statistics.stdev(times) if len(times) > 1 else 0.0, 'repeats': repeats}
+
+
+def pong_network_run():
+    """1000 single network forward passes, the way pong.py runs its AI."""
+    network = pong_nn.NeuralNetwork()
+    inputs = np.random.uniform(0, 400, size=(1000, pong_nn.INPUT_NODES))
+
+    def run():
+        for inp in inputs:
+            network.run(inp)
+    return run
+
+
+def pong_population_run():
+    """100 batched forward passes of 1000 networks, one per frame of a vectorized trial."""
+    population = pong_nn.Population.random(TRIAL_AGENTS, np.random.default_rng(SEED))
+    inputs = np.random.uniform(0, 400, size=(TRIAL_AGENTS, pong_nn.INPUT_NODES))
+
+    def run():
+        for _ in range(100):
+            population.run(inputs)
+    return run
+
+
+def pong_crossover():
+    """1000 crossovers and mutations of single networks."""
+    parents = [pong_nn.NeuralNetwork() for _ in range(100)]
+
+    def run():
+        for i in range(1000):
+            pong_nn.crossover(parents[i % 100], parents[(i * 7 + 1) % 100]).mutate()
+    return run
+
+
+def pong_crossover_population():
+    """Breeds and mutates a generation of 1000 networks at once."""
+    rng = np.random.default_rng(SEED)
+    population = pong_nn.Population.random(TRIAL_AGENTS, rng)
+    parents1 = rng.integers(TRIAL_AGENTS, size=TRIAL_AGENTS)
+    parents2 = rng.integers(TRIAL_AGENTS, size=TRIAL_AGENTS)
+
+    def run():
+        pong_nn.mutate_population(pong_nn.crossover_population(population, parents1, parents2, rng), rng)
+    return run
+
+
+def pong_ball_update():
+    """Flies 100 balls from the left paddle until they reach it again."""
+    balls = [ai_pong.Ball(random.Random(i)) for i in range(100)]
+
+    def run():
+        for ball in balls:
+            while ball.update() is None:
+                pass
+    return run
+
+
+def pong_do_trial():
+    """10 trials with do_trial."""
+    population = pong_nn.Population.random(SCALAR_TRIAL_AGENTS, np.random.default_rng(SEED))
+
+    def run():
+        for i in range(10):
+            ai_pong.do_trial(population, i)
+    return run
+
+
+def pong_do_trial_vectorized():
+    """10 trials with do_trial_vectorized."""
+    population = pong_nn.Population.random(TRIAL_AGENTS, np.random.default_rng(SEED))
+
+    def run():
+        for i in range(10):
+            ai_pong.do_trial_vectorized(population, i)
+    return run
+
+
+def pong_generation(evaluator):
+    """One full generation of ai_pong.py: evaluating every network on the pool, ranking them and breeding the next
+    generation."""
+    def case():
+        rng = np.random.default_rng(SEED)
+        games = pong_nn.Population.random(GENERATION_AGENTS, rng)
+
+        def run():
+            scores = evaluator.evaluate(games)
+            ai_pong.next_generation(games, scores, rng)
+        return run
+    return case
+
+
+def flappy_second():
+    """One second of frames of headless flappy bird."""
+    population = flappy_nn.Population([flappy_nn.NeuralNetwork() for _ in range(FLAPPY_BIRDS)])
+
+    def run():
+        course = headless_flappy_bird.PipeCourse(SEED)
+        headless_flappy_bird.FlappySimulator(FLAPPY_BIRDS, course).run(population, max_frames=FLAPPY_FRAMES)
+    return run
+
+
+def run_benchmarks(warmup: int = WARMUP, repeats: int = REPEATS, only: list[str] = None) -> dict:
+    """Runs every benchmark case.
+
+    Args:
+        warmup (int, optional): untimed runs of every case. Defaults to WARMUP.
+        repeats (int, optional): timed runs of every case. Defaults to REPEATS.
+        only (list[str], optional): names of the cases to run. Defaults to None, which runs all of them.
+
+    Returns:
+        dict: the machine the benchmarks ran on and the timings of every case
+    """
+    cases = {
+        'pong_network_run': pong_network_run,
+        'pong_population_run': pong_population_run,
+        'pong_crossover': pong_crossover,
+        'pong_crossover_population': pong_crossover_population,
+        'pong_ball_update': pong_ball_update,
+        'pong_do_trial': pong_do_trial,
+        'pong_do_trial_vectorized': pong_do_trial_vectorized,
+        'flappy_second': flappy_second,
+    }
+    results = {}
+    for name, case in cases.items():
+        if only is None or name in only:
+            results[name] = measure(case, warmup, repeats)
+            print(f'{name}: {results[name]["median"] * 1000:.2f}ms median')
+            sys.stdout.flush()
+
+    if only is None or 'pong_generation' in only:
+        # the generation benchmark plays fresh balls without the fitness cache, so every repeat does the same work and
+        # nothing is written to disk
+        ai_pong.TRAJECTORY_SEED = None
+        evaluator = ai_pong.Evaluator(GENERATION_AGENTS, GENERATION_TRIALS)
+        evaluator.cache = None
+        try:
+            results['pong_generation'] = measure(pong_generation(evaluator), warmup, repeats)
+        finally:
+            evaluator.close()
+        print(f'pong_generation: {results["pong_generation"]["median"] * 1000:.2f}ms median')
+
+    return {
+        'machine': {'python': platform.python_version(), 'numpy': np.__version__, 'platform': platform.platform(),
+                    'processor': platform.processor(), 'cpu_count': os.cpu_count()},
+        'cases': results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float = THRESHOLD) -> list[str]:
+    """Compares benchmark results against a baseline.
+
+    Args:
+        results (dict): results of run_benchmarks
+        baseline (dict): earlier results of run_benchmarks, ideally from the same machine
+        threshold (float, optional): how much slower a case's median may be before it counts as a regression.
+        Defaults to THRESHOLD.
+
+    Returns:
+        list[str]: the cases that regressed
+    """
+    regressions = []
+    for name, timing in results['cases'].items():
+        if name not in baseline['cases']:
+            continue
+        old = baseline['cases'][name]['median']
+        change = timing['median'] / old - 1
+        flag = 'REGRESSION' if change > threshold else ''
+        print(f'{name}: {old * 1000:.2f}ms -> {timing["median"] * 1000:.2f}ms ({change:+.1%}) {flag}')
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the simulation and training hot paths.')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against results saved earlier and exit with 1 on a regression')
+    parser.add_argument('--save-baseline', metavar='PATH', help='save the results as the baseline to compare against')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help=f'fraction slower a case may be before it is a regression (default: {THRESHOLD})')
+    parser.add_argument('--warmup', type=int, default=WARMUP, help=f'untimed runs of each case (default: {WARMUP})')
+    parser.add_argument('--repeats', type=int, default=REPEATS, help=f'timed runs of each case (default: {REPEATS})')
+    parser.add_argument('cases', nargs='*', help='names of the cases to run (default: all of them)')
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.warmup, args.repeats, args.cases or None)
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            with open(path, 'w') as f:
+                json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print('============================')
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,118 @@
+import numpy as np
+
+# parent selection strategies. Each works on a whole generation's fitness array at once and returns the indices of the
+# picked parents, so selecting parents for every child is a handful of numpy calls.
+TOURNAMENT_SIZE = 10  # default tournament size (https://en.wikipedia.org/wiki/Tournament_selection)
+TRUNCATION_FRACTION = .2  # truncation selection picks parents uniformly from this fraction of the best networks
+RANK_PRESSURE = 1.5  # linear ranking: the best network is this many times as likely to be picked as an average one (1 to 2)
+
+
+def sample(probabilities: np.ndarray, num: int, rng: np.random.Generator, exclude: np.ndarray = None) -> np.ndarray:
+    """Picks num indices with the given probabilities by inverting the cumulative distribution.
+
+    Args:
+        probabilities (np.ndarray): chance of picking each index. Must sum to 1.
+        num (int): how many indices to pick
+        rng (np.random.Generator): random number generator to draw from
+        exclude (np.ndarray, optional): index that pick i may not be, for every pick. The other probabilities are
+        scaled up to fill its share. Defaults to None.
+
+    Returns:
+        np.ndarray: the picked indices
+    """
+    cdf = np.cumsum(probabilities)
+    if exclude is None:
+        draws = rng.random(num) * cdf[-1]
+    else:
+        # draw from the distribution with the excluded index's share cut out, then skip over that share
+        excluded = probabilities[exclude]
+        draws = rng.random(num) * (cdf[-1] - excluded)
+        draws += excluded * (draws >= cdf[exclude] - excluded)
+    picks = np.minimum(np.searchsorted(cdf, draws, side='right'), len(probabilities) - 1)
+    if exclude is not None:
+        # only possible when the excluded index held all of the probability
+        same = picks == exclude
+        picks[same] = (picks[same] + 1) % len(probabilities)
+    return picks
+
+
+def tournament(fitness: np.ndarray, num: int, rng: np.random.Generator, exclude: np.ndarray = None,
+               size: int = TOURNAMENT_SIZE) -> np.ndarray:
+    """Tournament selection. Every pick is the fittest of size random entrants, and all num tournaments are drawn as
+    one (num, size) matrix of entrants. Entrants are drawn with replacement, so a network can enter a tournament twice.
+
+    Args:
+        fitness (np.ndarray): every network's fitness, higher is better
+        num (int): how many parents to pick
+        rng (np.random.Generator): random number generator to draw from
+        exclude (np.ndarray, optional): network that tournament i may not include, for every tournament. Defaults to
+        None.
+        size (int, optional): entrants per tournament. Defaults to TOURNAMENT_SIZE.
+
+    Returns:
+        np.ndarray: index of every picked parent
+    """
+    if exclude is None:
+        entrants = rng.integers(len(fitness), size=(num, size))
+    else:
+        # draw from every index but one and shift the ones at or after the excluded index up by one
+        entrants = rng.integers(len(fitness) - 1, size=(num, size))
+        entrants += entrants >= exclude[:, None]
+    return entrants[np.arange(num), np.argmax(fitness[entrants], axis=1)]
+
+
+def truncation(fitness: np.ndarray, num: int, rng: np.random.Generator, exclude: np.ndarray = None) -> np.ndarray:
+    """Truncation selection. Parents are picked uniformly from the best TRUNCATION_FRACTION of the networks (at least
+    two). Same arguments as tournament."""
+    keep = max(int(len(fitness) * TRUNCATION_FRACTION), 2)
+    probabilities = np.zeros(len(fitness))
+    probabilities[np.argsort(-fitness, kind='stable')[:keep]] = 1 / keep
+    return sample(probabilities, num, rng, exclude)
+
+
+def rank(fitness: np.ndarray, num: int, rng: np.random.Generator, exclude: np.ndarray = None) -> np.ndarray:
+    """Linear rank selection. The chance of picking a network falls linearly with its rank, from RANK_PRESSURE / N for
+    the best network to (2 - RANK_PRESSURE) / N for the worst, so only the order of the fitness values matters. Same
+    arguments as tournament."""
+    n = len(fitness)
+    ranks = np.empty(n)
+    ranks[np.argsort(-fitness, kind='stable')] = np.arange(n)  # 0 for the best network
+    probabilities = (RANK_PRESSURE - 2 * (RANK_PRESSURE - 1) * ranks / max(n - 1, 1)) / n
+    return sample(probabilities, num, rng, exclude)
+
+
+def proportional(fitness: np.ndarray, num: int, rng: np.random.Generator, exclude: np.ndarray = None) -> np.ndarray:
+    """Fitness proportional (roulette wheel) selection. The chance of picking a network is proportional to how much
+    fitter it is than the least fit network, or uniform if every network is equally fit. Same arguments as
+    tournament."""
+    weights = fitness - fitness.min()
+    if weights.sum() <= 0:
+        weights = np.ones(len(fitness))
+    return sample(weights / weights.sum(), num, rng, exclude)
+
+
+# selection strategies by name
+SELECTIONS = {'tournament': tournament, 'truncation': truncation, 'rank': rank, 'proportional': proportional}
+
+
+def select_parents(fitness, num_pairs: int, rng: np.random.Generator, strategy: str = 'tournament',
+                   tournament_size: int = TOURNAMENT_SIZE) -> tuple[np.ndarray, np.ndarray]:
+    """Picks two distinct parents for each of num_pairs children. Every second parent is picked with its first parent
+    excluded, so no pair ever has to be redrawn.
+
+    Args:
+        fitness (array-like): every network's fitness, higher is better
+        num_pairs (int): how many pairs of parents to pick
+        rng (np.random.Generator): random number generator to draw from
+        strategy (str, optional): a key of SELECTIONS. Defaults to 'tournament'.
+        tournament_size (int, optional): entrants per tournament for tournament selection. Defaults to TOURNAMENT_SIZE.
+
+    Returns:
+        tuple[np.ndarray, np.ndarray]: indices of every child's first and second parent
+    """
+    fitness = np.asarray(fitness, dtype=np.float64)
+    select = SELECTIONS[strategy]
+    options = {'size': tournament_size} if select is tournament else {}
+    parents1 = select(fitness, num_pairs, rng, **options)
+    parents2 = select(fitness, num_pairs, rng, exclude=parents1, **options)
+    return parents1, parents2
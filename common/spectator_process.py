@@ -0,0 +1,71 @@
+import multiprocessing
+import queue
+
+# the process and queue plumbing of the games' spectator windows (pong/spectator.py and flappy_bird/spectator.py). A
+# Spectator runs a game window in its own process and shows whichever champion the trainer sent it last, so the trainer
+# never waits on drawing.
+SPECTATOR_FPS = 60  # frames per second of the spectator window
+
+
+def snapshot(network, label: str = '') -> tuple:
+    """Returns a network as a snapshot for Spectator.send: plain lists, so it pickles quickly.
+
+    Args:
+        network (NeuralNetwork): network to send
+        label (str, optional): shown in the spectator's window title, e.g. the generation. Defaults to ''.
+
+    Returns:
+        tuple: the network's layer sizes and genome, and the label
+    """
+    return list(network.layer_sizes), [float(value) for value in network.genome], label
+
+
+class Spectator:
+    def __init__(self, target, fps: int = SPECTATOR_FPS):
+        """Starts a spectator process.
+
+        Args:
+            target (function): runs in the spectator process and is given the snapshot queue and fps, e.g.
+            spectator.watch_pong
+            fps (int, optional): frames per second of the window. Defaults to SPECTATOR_FPS.
+        """
+        # holds at most the newest snapshot. Older ones are dropped in send if the spectator hasn't taken them yet.
+        self.snapshots = multiprocessing.Queue(maxsize=1)
+        self.process = multiprocessing.Process(target=target, args=(self.snapshots, fps), daemon=True)
+        self.process.start()
+
+    def send(self, snapshot: tuple):
+        """Hands the spectator a new snapshot without ever waiting. If it hasn't taken the last one yet, the last one is
+        replaced, and once its window is closed snapshots are ignored.
+
+        Args:
+            snapshot (tuple): the snapshot, see snapshot
+        """
+        if not self.process.is_alive():
+            return
+        try:
+            self.snapshots.get_nowait()  # stale, the spectator fell behind
+        except queue.Empty:
+            pass
+        try:
+            self.snapshots.put_nowait(snapshot)
+        except queue.Full:
+            pass  # the spectator just took a snapshot and this one can wait for the next send
+
+    def close(self):
+        """Closes the spectator's window and waits for its process to end."""
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join()
+        # the spectator won't read what's left in the queue, so don't wait for it to be flushed
+        self.snapshots.cancel_join_thread()
+
+
+def newest(snapshots) -> tuple:
+    """Takes every snapshot waiting in the queue and returns the newest one, or None if there are none."""
+    latest = None
+    while True:
+        try:
+            latest = snapshots.get_nowait()
+        except queue.Empty:
+            return latest
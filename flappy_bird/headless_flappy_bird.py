@@ -0,0 +1,154 @@
+import math
+import sys
+import time
+import numpy as np
+from nn import NeuralNetwork, Population
+
+# the AI flappy bird game without a display, for training. pygame is never imported here. ai_flappy_bird.py draws this
+# simulation, so these values are used by both. They should match those in flappy_bird.py if you expect the AI to
+# behave the same in the human playable game.
+GRAVITY = .8  # how fast bird accelerates downward
+GAP_SIZE = 180  # distance between the top and the bottom of a pipe
+PIPE_SCROLL_SPEED = 2  # how fast pipes move towards bird
+FLAP_STRENGTH = 13  # how much vertical velocity a flap adds
+BIRD_RADIUS = 25  # bird radius
+TERMINAL_VELOCITY = -10  # top downward velocity
+DISTANCE_BETWEEN_PIPES = 250  # distance between pipes
+PIPE_WIDTH = 85  # width of pipes
+PIPE_BUFFER = 20  # minimum distance to pipe from top or bottom of screen
+WINDOW_WIDTH = 480  # width of window
+WINDOW_HEIGHT = 640  # height of window
+
+NUM_AGENTS = 1000
+PIPE_CHUNK_SIZE = 64  # how many pipe gaps a course generates at a time
+
+BIRD_X = WINDOW_WIDTH / 2 - 50  # every bird flies at the same x coordinate
+PIPE_SPACING = DISTANCE_BETWEEN_PIPES + PIPE_WIDTH  # distance from one pipe's left edge to the next one's
+
+
+class PipeCourse:
+    def __init__(self, seed: int = None, chunk_size: int = PIPE_CHUNK_SIZE):
+        """An endless course of pipes. Pipe i starts at x coordinate WINDOW_WIDTH + i * PIPE_SPACING and every pipe
+        scrolls left PIPE_SCROLL_SPEED pixels per frame, so where a pipe is only depends on its index and the frame.
+        The gaps are drawn from seed chunk_size pipes at a time as the course is played, and the same seed always gives
+        the same course no matter how far it is played.
+
+        Args:
+            seed (int, optional): seed of the pipe gaps. Defaults to None, which gives a random course.
+            chunk_size (int, optional): how many gaps to generate at a time. Defaults to PIPE_CHUNK_SIZE.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.chunk_size = chunk_size
+        self.gaps = np.empty(0, dtype=np.int64)  # top of the gap of every pipe generated so far
+
+    def gap(self, index: int) -> int:
+        """Returns the y coordinate of the top of pipe index's gap, generating more of the course if needed."""
+        while index >= len(self.gaps):
+            # PIPE_BUFFER ensures that gaps are not right at edges of screen
+            chunk = self.rng.integers(PIPE_BUFFER, WINDOW_HEIGHT - GAP_SIZE - PIPE_BUFFER, size=self.chunk_size)
+            self.gaps = np.concatenate([self.gaps, chunk])
+        return int(self.gaps[index])
+
+    @staticmethod
+    def pipe_x(index: int, frame: int) -> float:
+        """Returns the x coordinate of the left edge of pipe index after frame frames."""
+        return WINDOW_WIDTH + index * PIPE_SPACING - frame * PIPE_SCROLL_SPEED
+
+    @staticmethod
+    def next_pipe(frame: int) -> int:
+        """Returns the index of the first pipe the birds have not gotten past yet after frame frames."""
+        return max(math.ceil((BIRD_X - PIPE_WIDTH - WINDOW_WIDTH + frame * PIPE_SCROLL_SPEED) / PIPE_SPACING), 0)
+
+    @staticmethod
+    def visible(frame: int) -> range:
+        """Returns the indices of the pipes on screen after frame frames."""
+        first = max(math.ceil((frame * PIPE_SCROLL_SPEED - PIPE_WIDTH - WINDOW_WIDTH) / PIPE_SPACING), 0)
+        return range(first, math.ceil(frame * PIPE_SCROLL_SPEED / PIPE_SPACING))
+
+
+class FlappySimulator:
+    def __init__(self, num_birds: int, course: PipeCourse = None):
+        """Creates num_birds birds at the start of a course. Bird state is kept in numpy arrays so every bird is updated
+        at once, and dead birds are masked out instead of removed.
+
+        Args:
+            num_birds (int): how many birds play the game at once
+            course (PipeCourse, optional): the pipes to fly through. Defaults to None, which creates a random course.
+        """
+        self.course = course if course is not None else PipeCourse()
+        self.y = np.full(num_birds, WINDOW_HEIGHT / 2)
+        self.velocity = np.zeros(num_birds)
+        self.alive = np.ones(num_birds, dtype=bool)
+        self.frames_alive = np.zeros(num_birds, dtype=int)  # how long each bird survived, used as its score
+        self.frame = 0
+        self.next_pipe = 0  # index of the pipe the birds have to get through next
+
+    def inputs(self) -> np.ndarray:
+        """Returns the network input of every bird: vertical distance from the bottom of the next pipe's gap.
+
+        Returns:
+            np.ndarray: array of shape (num_birds, 1)
+        """
+        return (self.y - (self.course.gap(self.next_pipe) + GAP_SIZE))[:, None]
+
+    def check_collision(self) -> np.ndarray:
+        """Arithmetic version of flappy_bird.check_collision for every bird against the next pipe. Like pygame.Rect,
+        the bird's bounding box is truncated to whole pixels and boxes that only touch do not collide.
+
+        Returns:
+            np.ndarray: True for every bird that hits the next pipe
+        """
+        pipe_x = self.course.pipe_x(self.next_pipe, self.frame)
+        gap = self.course.gap(self.next_pipe)
+        bird_left = math.trunc(BIRD_X - BIRD_RADIUS)
+        if not (bird_left < pipe_x + PIPE_WIDTH and pipe_x < bird_left + 2 * BIRD_RADIUS):
+            return np.zeros_like(self.alive)
+        bird_top = np.trunc(self.y - BIRD_RADIUS)
+        return (bird_top < gap) | (bird_top + 2 * BIRD_RADIUS > gap + GAP_SIZE)
+
+    def step(self, flaps: np.ndarray):
+        """Advances the game by one frame.
+
+        Args:
+            flaps (np.ndarray): True for every bird that flaps this frame. Ignored for dead birds.
+        """
+        alive = self.alive
+        velocity = np.where(flaps, FLAP_STRENGTH, self.velocity)
+        velocity = np.maximum(velocity - GRAVITY, TERMINAL_VELOCITY)  # don't let bird exceed terminal velocity
+        y = np.maximum(self.y - velocity, BIRD_RADIUS)  # don't let bird hit top of screen
+        self.velocity = np.where(alive, velocity, self.velocity)
+        self.y = np.where(alive, y, self.y)
+        dead = self.y >= WINDOW_HEIGHT - BIRD_RADIUS  # touching the bottom
+
+        # the pipes scroll, then birds are checked against the pipe that was next before they moved
+        self.frame += 1
+        dead |= self.check_collision()
+        self.next_pipe = self.course.next_pipe(self.frame)
+
+        self.alive = alive & ~dead
+        self.frames_alive[self.alive] += 1
+
+    def run(self, population: Population, max_frames: int = None) -> np.ndarray:
+        """Plays the game until every bird is dead (or max_frames have passed).
+
+        Args:
+            population (Population): one network per bird
+            max_frames (int, optional): stop after this many frames even if birds are still alive. Defaults to None.
+
+        Returns:
+            np.ndarray: number of frames each bird survived
+        """
+        while self.alive.any() and (max_frames is None or self.frame < max_frames):
+            self.step(population.run(self.inputs())[:, 0] > 0)
+        return self.frames_alive
+
+
+if __name__ == '__main__':
+    simulator = FlappySimulator(NUM_AGENTS)
+    population = Population([NeuralNetwork() for _ in range(NUM_AGENTS)])
+    start = time.time()
+    scores = simulator.run(population, max_frames=100000)
+    elapsed = time.time() - start
+    print(f'best bird survived {scores.max()} frames')
+    print(f'{simulator.frame} frames in {elapsed:.2f}s ({simulator.frame / elapsed:.0f} frames per second)')
+    sys.stdout.flush()
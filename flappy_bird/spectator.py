@@ -0,0 +1,59 @@
+import os
+import sys
+# modules shared by both games, like spectator_process.py, live in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+from spectator_process import SPECTATOR_FPS, newest
+
+# watch training live. watch_flappy_bird runs in a spectator_process.Spectator and flies whichever champion the trainer
+# sent it last in an ai_flappy_bird.py window.
+
+
+def watch_flappy_bird(snapshots, fps: int = SPECTATOR_FPS):
+    """Spectator process flying the newest snapshot through random pipe courses. A new snapshot takes over when the
+    current bird crashes.
+
+    Args:
+        snapshots (multiprocessing.Queue): queue the snapshots arrive on
+        fps (int, optional): frames per second of the window. Defaults to SPECTATOR_FPS.
+    """
+    # pygame is only imported in the spectator process, so the trainer never opens a display
+    import numpy as np
+    import pygame
+    from nn import Population
+    from headless_flappy_bird import WINDOW_HEIGHT, WINDOW_WIDTH, FlappySimulator, PipeCourse
+    from ai_flappy_bird import Renderer
+
+    window = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
+    pygame.display.set_caption('Flappy Bird spectator: waiting for the first champion')
+    clock = pygame.time.Clock()
+
+    bird = None
+    pending = None  # newest snapshot, until the current bird crashes
+    simulator = None
+    renderer = None
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+        latest = newest(snapshots)
+        if latest is not None:
+            pending = latest
+        if simulator is None or not simulator.alive.any():
+            if pending is not None:
+                layer_sizes, genome, label = pending
+                bird = Population.from_genomes(np.array([genome]), layer_sizes)
+                pending = None
+                pygame.display.set_caption(f'Flappy Bird spectator: {label}')
+            if bird is not None:
+                simulator = FlappySimulator(1, PipeCourse())
+                renderer = Renderer(window)
+        if simulator is None:
+            # nothing to show until the first snapshot arrives
+            clock.tick(fps)
+            continue
+
+        simulator.step(bird.run(simulator.inputs())[:, 0] > 0)
+        renderer.draw(simulator.course, simulator.frame, simulator.y[simulator.alive])
+        clock.tick(fps)
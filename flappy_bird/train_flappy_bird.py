@@ -0,0 +1,132 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import random
+import sys
+import numpy as np
+# modules shared by both games, like selection.py, live in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+from functools import partial
+from nn import Population, crossover_population, mutate_population, layer_sizes_from_constants
+from headless_flappy_bird import FlappySimulator, PipeCourse
+from selection import select_parents
+from spectator import watch_flappy_bird
+from spectator_process import Spectator, snapshot
+
+# trains flappy bird AIs with neuroevolution, like ai_pong.py does for pong. Games are simulated headlessly with
+# headless_flappy_bird.py, so training runs far faster than the 60 frames per second of ai_flappy_bird.py.
+NUM_AGENTS = 1000  # how many agents to introduce each generation
+GENERATIONS = 50
+SELECT_NUM = 10  # how many agents automatically advance to the next generation without modification. Also impacts number of results printed.
+RANDOM_NETWORKS_PER_GEN = 0  # introduce a number of random networks each generation, this can prevent stagnation
+TOURNAMENT_SIZE = 10  # in tournament selection (https://en.wikipedia.org/wiki/Tournament_selection) the tournament size.
+SELECTION = 'tournament'  # how parents are picked: 'tournament', 'truncation', 'rank' or 'proportional' (see common/selection.py)
+COURSES_PER_GEN = 16  # how many pipe courses every agent plays each generation
+COURSE_SEED = 0  # seed of the courses. Every generation plays its own courses, the same ones in every run. None plays unseeded random courses.
+BREEDING_SEED = 0  # seed of the starting networks, selection, crossover and mutation. None breeds differently every run.
+MAX_FRAMES = 60 * 60 * 2  # a course ends after this many frames even if birds are still alive (2 minutes at 60 FPS)
+CHAMPION_PATH = 'flappy_champion.pickle'  # where the best network overall is saved
+LAST_GEN_PATH = 'flappy_last_gen.pickle'  # where the best network of the newest generation is saved
+
+
+def play_course(genomes: np.ndarray, seed: int) -> np.ndarray:
+    """Plays one pipe course with every network. Used as a pool task.
+
+    Args:
+        genomes (np.ndarray): (N, P) array holding one network's genome per row
+        seed (int): seed of the course's pipe gaps
+
+    Returns:
+        np.ndarray: number of frames each network's bird survived
+    """
+    population = Population.from_genomes(genomes, layer_sizes_from_constants())
+    return FlappySimulator(len(population), PipeCourse(seed)).run(population, max_frames=MAX_FRAMES)
+
+
+def course_seeds(gen: int) -> list[int]:
+    """Returns the seeds of the courses played in generation gen. Every generation gets new courses, so the networks
+    can't overfit to a fixed set, but they are derived from COURSE_SEED and gen so a run can be repeated exactly."""
+    if COURSE_SEED is None:
+        return [random.getrandbits(64) for _ in range(COURSES_PER_GEN)]
+    return [int(seed) for seed in np.random.SeedSequence([COURSE_SEED, gen]).generate_state(COURSES_PER_GEN, np.uint64)]
+
+
+def evaluate(pool, games: Population, seeds: list[int]) -> np.ndarray:
+    """Scores every network by the average number of frames it survives over the courses. Each course is played by a
+    pool worker.
+
+    Args:
+        pool (multiprocessing.Pool): pool to play the courses on
+        games (Population): networks to score
+        seeds (list[int]): seeds of the courses
+
+    Returns:
+        np.ndarray: each network's score
+    """
+    return np.mean(pool.map(partial(play_course, games.genomes), seeds), axis=0)
+
+
+def next_generation(games: Population, scores: np.ndarray, rng: np.random.Generator) -> Population:
+    """Creates the next generation. The best SELECT_NUM networks advance unchanged and the rest are children of
+    parents picked with SELECTION, bred and mutated all at once.
+
+    Args:
+        games (Population): the current generation
+        scores (np.ndarray): every network's score
+        rng (np.random.Generator): random number generator for selection and breeding
+
+    Returns:
+        Population: the next generation, with the elites first
+    """
+    elites = np.argsort(-scores, kind='stable')[:SELECT_NUM]
+    num_children = len(games) - len(elites) - RANDOM_NETWORKS_PER_GEN
+    parents1, parents2 = select_parents(scores, num_children, rng, SELECTION, TOURNAMENT_SIZE)
+
+    # breed every child at once, then mutate them. Elites advance unchanged.
+    children = mutate_population(crossover_population(games, parents1, parents2, rng), rng)
+    new_games = [games.take(elites), children]
+    if RANDOM_NETWORKS_PER_GEN > 0:
+        new_games.append(Population.random(RANDOM_NETWORKS_PER_GEN, rng))
+    return Population.concatenate(new_games)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train flappy bird AIs with neuroevolution.')
+    parser.add_argument('--spectate', action='store_true', help='watch the champion fly in a window while training')
+    args = parser.parse_args()
+
+    best_score = -1
+    best_nn = None
+    spectator = Spectator(watch_flappy_bird) if args.spectate else None
+    rng = np.random.default_rng(BREEDING_SEED)
+    games = Population.random(NUM_AGENTS, rng)
+
+    # this will use ALL of your CPU for the duration of the runtime
+    with multiprocessing.Pool(multiprocessing.cpu_count()) as pool:
+        for gen in range(GENERATIONS):
+            scores = evaluate(pool, games, course_seeds(gen))
+            # indices of the networks from best to worst score
+            ranking = np.argsort(-scores, kind='stable')
+            if scores[ranking[0]] > best_score:
+                best_score = scores[ranking[0]]
+                best_nn = games.network(ranking[0])
+                # save champion
+                with open(CHAMPION_PATH, 'wb') as f:
+                    pickle.dump(best_nn, f)
+
+            print(f'Generation {gen + 1} results (frames survived, averaged over {COURSES_PER_GEN} courses)')
+            for i in range(SELECT_NUM):
+                print(scores[ranking[i]])
+            print('============================')
+            sys.stdout.flush()
+            if spectator is not None:
+                spectator.send(snapshot(best_nn, f'generation {gen + 1} champion, {best_score:.0f} frames'))
+
+            games = next_generation(games, scores, rng)
+            # save winner from last generation
+            with open(LAST_GEN_PATH, 'wb') as f:
+                pickle.dump(games.network(0), f)
+
+    if spectator is not None:
+        spectator.close()
@@ -1,9 +1,28 @@
+import argparse
 import math
+import os
 import random
 import sys
-from nn import NeuralNetwork, crossover
+import numpy as np
+# modules shared by both games, like selection.py, live in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+from nn import DTYPE, NeuralNetwork, Population, crossover_population, layer_sizes_from_constants, mutate_population
+from policy import export_policy
+from walls import fold_y
+from checkpoint import CheckpointWriter, load_checkpoint, rng_states, set_rng_states
+from fitness_cache import FitnessCache
+import kernels
+from metrics import MetricsLog, fitness_stats, merge_profiles, timed
+from selection import select_parents
+from shared_population import SharedPopulation, shared_array
+from spectator import watch_pong
+from spectator_process import Spectator, snapshot
+import cProfile
 import pickle
 import multiprocessing
+import shutil
+import tempfile
+import time
 from functools import partial
 
 # changing any of these will change something about the game.
@@ -27,16 +46,37 @@ SELECT_NUM = 10  # how many agents automatically advance to the next generation
 RANDOM_NETWORKS_PER_GEN = 0  # introduce a number of random networks each generation, this can prevent stagnation
 TRIALS_PER_GEN = 1000  # how many trials to run each generation 
 TOURNAMENT_SIZE = 10  # in tournament selection (https://en.wikipedia.org/wiki/Tournament_selection) the tournament size.
+SELECTION = 'tournament'  # how parents are picked: 'tournament', 'truncation', 'rank' or 'proportional' (see common/selection.py)
+VECTORIZED_TRIALS = True  # move every paddle at once with numpy (do_trial_vectorized) instead of one at a time (do_trial)
+USE_JIT = True  # play trials with the compiled kernels in kernels.py when numba is installed. Ignored without numba.
+TRAJECTORY_SEED = 0  # seed of the trajectory bank replayed every generation. None plays fresh random balls every trial.
+TRAJECTORY_BANK_PATH = 'trajectory_bank'  # directory the trajectory bank is cached in. None keeps it in memory only.
+CHECKPOINT_PATH = 'checkpoint.npz'  # where the whole training state is saved so training can be resumed with --resume
+CHECKPOINT_EVERY = 1  # save a checkpoint every this many generations. 0 turns checkpoints off.
+FITNESS_CACHE_SIZE = 10000  # how many genomes' results to remember so elites and duplicates aren't re-simulated. 0 turns the cache off.
+RACING = False  # run trials in rounds and stop spending trials on agents that are clearly worse than the rest (see race)
+RACING_FIRST_ROUND = 50  # trials in the first racing round. Every round after has twice as many, up to TRIALS_PER_GEN in total.
+RACING_KEEP = .5  # at most this fraction of agents advance to the next racing round
+RACING_CONFIDENCE = 2  # agents this many standard errors below the SELECT_NUM-th best agent are dropped too
+METRICS_PATH = 'metrics.jsonl'  # timings and fitness statistics of every generation are written here. None turns them off.
+PROFILE_PATH = 'profile.pstats'  # where --profile saves the merged cProfile stats of every pool worker
+SELF_PLAY = False  # score networks by Elo rating in a tournament against each other (self_play.py) instead of with trials
+SELF_PLAY_SCHEDULE = 'sampled'  # who plays who in self-play: 'sampled' (SELF_PLAY_ROUNDS random opponents each) or 'round_robin' (everyone, slow for large populations)
+TRIAL_CHUNKS_PER_WORKER = 8  # trials are sent to the pool in about this many chunks per worker. More chunks leave less idle time at the end of a generation, fewer send fewer messages.
 
 class Ball:
-    def __init__(self):
+    def __init__(self, rng: random.Random = random):
         """Create ball object such that it has been hit in a possible way
+
+        Args:
+            rng (random.Random, optional): where the ball's random numbers come from. Defaults to the random module.
         """
+        self.rng = rng
         paddle_y = -1
         # randomize starting position until paddle would be at a legal position
         while paddle_y < 0 or paddle_y + PADDLE_HEIGHT > SCREEN_HEIGHT:
             self.x = PADDLE_DIST_FROM_EDGE + PADDLE_WIDTH + BALL_RADIUS
-            self.y = random.randint(BALL_RADIUS, SCREEN_HEIGHT - BALL_RADIUS)
+            self.y = self.rng.randint(BALL_RADIUS, SCREEN_HEIGHT - BALL_RADIUS)
             self.randomize_start_vel()
 
             angle = math.degrees(math.atan(self.y_velocity / self.x_velocity))
@@ -45,7 +85,7 @@ class Ball:
     def randomize_start_vel(self):
         """Randomizes start velocity for ball up to BALL_MAX_ANGLE
         """
-        angle = random.randint(-BALL_MAX_ANGLE, BALL_MAX_ANGLE)
+        angle = self.rng.randint(-BALL_MAX_ANGLE, BALL_MAX_ANGLE)
         angle = math.radians(angle)
         self.x_velocity = BALL_START_SPEED * math.cos(angle)
         self.y_velocity = BALL_START_SPEED * math.sin(angle)
@@ -63,7 +103,7 @@ class Ball:
         self.x = SCREEN_WIDTH - PADDLE_DIST_FROM_EDGE - PADDLE_WIDTH - BALL_RADIUS
         self.y = collision_y
 
-        angle = random.randrange(-BALL_MAX_ANGLE, BALL_MAX_ANGLE) + 180
+        angle = self.rng.randrange(-BALL_MAX_ANGLE, BALL_MAX_ANGLE) + 180
         self.x_velocity = math.cos(math.radians(angle)) * BALL_START_SPEED
         self.y_velocity = math.sin(math.radians(angle)) * BALL_START_SPEED
 
@@ -111,11 +151,85 @@ class Ball:
             self.y = new_y
 
 
+def frames_until_paddle(x, x_velocity):
+    """Number of frames until Ball.update reaches the plane of the paddle the ball is moving towards.
+
+    Args:
+        x (float | np.ndarray): x coordinate of the ball
+        x_velocity (float | np.ndarray): x velocity of the ball
+
+    Returns:
+        int | np.ndarray: how many frames the ball moves freely before the frame it collides on
+    """
+    left_paddle = PADDLE_DIST_FROM_EDGE + PADDLE_WIDTH
+    right_paddle = SCREEN_WIDTH - left_paddle
+    # update collides on the first frame where x + x_velocity reaches the paddle plane. Reaching it exactly counts,
+    # so allow for rounding error when the ball lands right on the plane (e.g. 60 degree angles).
+    frames = np.where(x_velocity > 0,
+                      np.ceil((right_paddle - BALL_RADIUS - x) / x_velocity - 1 - 1e-9),
+                      np.ceil((x - BALL_RADIUS - left_paddle) / -x_velocity - 1 - 1e-9))
+    return np.maximum(frames, 0).astype(int)
+
+
+class BallFlight:
+    def __init__(self, ball: Ball):
+        """Event driven version of a trial's ball. Instead of stepping frame by frame, the right paddle collision and
+        the left wall hit are calculated directly, so the hit location and trial length are known in O(1). The
+        right collision still goes through ball.collision_right, so the same random return angle is drawn as when
+        stepping. Matches Ball.update to within float tolerance.
+
+        Args:
+            ball (Ball): freshly created ball. It is moved to the right paddle by this.
+        """
+        self.start = (ball.x, ball.y, ball.x_velocity, ball.y_velocity)
+        # frame on which the ball hits the right paddle
+        self.right_frame = int(frames_until_paddle(ball.x, ball.x_velocity))
+        ball.x = self.start[0] + self.right_frame * self.start[2]
+        y, direction = fold_y(self.start[1] + self.right_frame * self.start[3], self.start[3], SCREEN_HEIGHT,
+                              BALL_RADIUS)
+        ball.y = y
+        ball.y_velocity = self.start[3] * direction
+        ball.collision_right()
+        # after the right paddle, the ball moves in a straight line from where it was placed by collision_right
+        self.returned = (ball.x, ball.y, ball.x_velocity, ball.y_velocity)
+        # frame on which collision_left is reached, counted from right_frame
+        self.left_frame = 1 + int(frames_until_paddle(ball.x + ball.x_velocity, ball.x_velocity))
+
+        x, y, x_velocity, y_velocity = self.position(self.right_frame + self.left_frame)
+        self.hit_y = float(y + y_velocity / x_velocity * (PADDLE_DIST_FROM_EDGE + PADDLE_WIDTH + BALL_RADIUS - (x - BALL_RADIUS)))
+
+    def __len__(self) -> int:
+        """Number of times Ball.update is called during the trial, including the one that returns the hit."""
+        return self.right_frame + self.left_frame + 1
+
+    def position(self, frames):
+        """Where the ball is at the start of a frame, as it would be after that many calls to Ball.update.
+
+        Args:
+            frames (int | np.ndarray): frame number(s) between 0 and len(self) - 1
+
+        Returns:
+            tuple: x, y, x velocity and y velocity of the ball (floats or arrays matching frames)
+        """
+        frames = np.asarray(frames)
+        before = frames <= self.right_frame
+        # before the right collision, move from the start; after it, from where collision_right placed the ball
+        x, y, x_velocity, y_velocity = (np.where(before, a, b) for a, b in zip(self.start, self.returned))
+        moved = np.where(before, frames, frames - self.right_frame)
+        y, direction = fold_y(y + moved * y_velocity, y_velocity, SCREEN_HEIGHT, BALL_RADIUS)
+        return x + moved * x_velocity, y, x_velocity, y_velocity * direction
+
+    def states(self) -> np.ndarray:
+        """Returns the ball's (x, y, x velocity, y velocity) at the start of every frame of the trial, shape
+        (len(self), 4)."""
+        return np.stack(self.position(np.arange(len(self))), axis=1)
+
+
 def do_trial(neural_nets, _):
-    """_summary_
+    """Plays a single trial with every neural network and returns how close each one got to the ball.
 
     Args:
-        neural_nets (list[NeuralNetwork]): list of neural networks to play the game
+        neural_nets (Population | list[NeuralNetwork]): the neural networks to play the game
         gen_num (int): generation number
         _ : dummy variable given by multiprocessing.map
 
@@ -127,12 +241,15 @@ def do_trial(neural_nets, _):
     angle = math.degrees(math.atan(ball.y_velocity / ball.x_velocity))
     paddle_y = ball.y - angle / BALL_MAX_ANGLE * (PADDLE_HEIGHT / 2 + BALL_RADIUS) - PADDLE_HEIGHT / 2
 
-    paddles = [paddle_y for _ in range(len(neural_nets))]
+    population = neural_nets if isinstance(neural_nets, Population) else Population(neural_nets)
+    paddles = [paddle_y for _ in range(len(population))]
     # do frames until the ball gets back to the wall
     while True:
-        for i in range(len(neural_nets)):
-            inp = [ball.x, ball.y, ball.x_velocity, ball.y_velocity, paddles[i] + PADDLE_HEIGHT / 2] 
-            up, down = neural_nets[i].run(inp)
+        # every network sees the same ball but its own paddle, so run them all in one batch
+        inp = [[ball.x, ball.y, ball.x_velocity, ball.y_velocity, paddle + PADDLE_HEIGHT / 2] for paddle in paddles]
+        outputs = population.run(inp)
+        for i in range(len(paddles)):
+            up, down = outputs[i]
             if up > 0 and not down > 0:
                 paddles[i] = max(paddles[i] - PADDLE_SPEED, 0)
             if down > 0 and not up > 0:
@@ -144,59 +261,681 @@ def do_trial(neural_nets, _):
             return rewards
 
 
+def do_trial_vectorized(neural_nets, _):
+    """Same trial as do_trial, but every paddle is stored in one numpy array and moved at once instead of one at a
+    time. Gives the same rewards as do_trial for the same ball.
+
+    Args:
+        neural_nets (Population | list[NeuralNetwork]): the neural networks to play the game
+        _ : dummy variable given by multiprocessing.map
+
+    Returns:
+        np.ndarray: reward value for each neural network determined by the distance to the ball's collision location.
+    """
+    ball = Ball()
+    angle = math.degrees(math.atan(ball.y_velocity / ball.x_velocity))
+    paddle_y = ball.y - angle / BALL_MAX_ANGLE * (PADDLE_HEIGHT / 2 + BALL_RADIUS) - PADDLE_HEIGHT / 2
+
+    population = neural_nets if isinstance(neural_nets, Population) else Population(neural_nets)
+    paddles = np.full(len(population), paddle_y)
+    inp = np.empty((len(population), 5))
+    # do frames until the ball gets back to the wall
+    while True:
+        inp[:, 0] = ball.x
+        inp[:, 1] = ball.y
+        inp[:, 2] = ball.x_velocity
+        inp[:, 3] = ball.y_velocity
+        inp[:, 4] = paddles + PADDLE_HEIGHT / 2
+        paddles = move_paddles(paddles, population.run(inp))
+        ball_update = ball.update()
+        if ball_update is not None:
+            # reward closer paddles more heavily
+            return 1 - np.abs(paddles + PADDLE_HEIGHT / 2 - ball_update) / SCREEN_HEIGHT
+
+
+# the game constants, as given to the kernels in kernels.py
+PHYSICS = kernels.Physics(SCREEN_WIDTH, SCREEN_HEIGHT, BALL_RADIUS, PADDLE_WIDTH, PADDLE_HEIGHT, PADDLE_DIST_FROM_EDGE,
+                          BALL_START_SPEED, PADDLE_SPEED)
+
+
+def jit_enabled() -> bool:
+    """Whether trials are played with the compiled kernels."""
+    return USE_JIT and kernels.NUMBA_AVAILABLE
+
+
+def do_trial_jit(neural_nets, _):
+    """Same trial as do_trial, played by the kernels in kernels.py: the ball is stepped with Ball.update's arithmetic by
+    kernels.ball_flight and every paddle is moved by kernels.paddle_trial. Draws the same random numbers as do_trial,
+    so the same random state gives the same ball.
+
+    Args:
+        neural_nets (Population | list[NeuralNetwork]): the neural networks to play the game
+        _ : dummy variable given by multiprocessing.map
+
+    Returns:
+        np.ndarray: reward value for each neural network determined by the distance to the ball's collision location.
+    """
+    ball = Ball()
+    angle = math.degrees(math.atan(ball.y_velocity / ball.x_velocity))
+    paddle_y = ball.y - angle / BALL_MAX_ANGLE * (PADDLE_HEIGHT / 2 + BALL_RADIUS) - PADDLE_HEIGHT / 2
+    # the angle Ball.collision_right would draw when the ball reaches the right paddle
+    return_angle = ball.rng.randrange(-BALL_MAX_ANGLE, BALL_MAX_ANGLE) + 180
+
+    population = Population(neural_nets) if isinstance(neural_nets, list) else neural_nets
+    frames, hit_y = kernels.ball_flight(ball.x, ball.y, ball.x_velocity, ball.y_velocity, return_angle, PHYSICS)
+    return kernels.paddle_trial(frames, paddle_y, hit_y, population.genomes, np.array(population.layer_sizes), PHYSICS)
+
+
+def move_paddles(paddles: np.ndarray, outputs: np.ndarray) -> np.ndarray:
+    """Moves every paddle one frame according to its network's (up, down) outputs, capping at the screen edges.
+
+    Args:
+        paddles (np.ndarray): y coordinate of each paddle
+        outputs (np.ndarray): array of shape (N, 2) holding each network's output
+
+    Returns:
+        np.ndarray: the moved paddles
+    """
+    up = outputs[:, 0] > 0
+    down = outputs[:, 1] > 0
+    paddles = np.where(up & ~down, np.maximum(paddles - PADDLE_SPEED, 0), paddles)
+    return np.where(down & ~up, np.minimum(paddles + PADDLE_SPEED, SCREEN_HEIGHT - PADDLE_HEIGHT), paddles)
+
+
+class TrajectoryBank:
+    def __init__(self, frames: np.ndarray, offsets: np.ndarray, start_paddles: np.ndarray, hit_ys: np.ndarray):
+        """Precomputed ball flights for a set of trials. The ball never looks at the paddles, so each trial's flight
+        can be computed once and replayed for every agent and every generation.
+
+        Args:
+            frames (np.ndarray): float32 array of shape (total frames, 4) holding (x, y, x velocity, y velocity) of the
+            ball at the start of every frame of every trial, one trial after another
+            offsets (np.ndarray): trial i's frames are frames[offsets[i]:offsets[i + 1]]
+            start_paddles (np.ndarray): where the paddle starts in each trial
+            hit_ys (np.ndarray): where the ball hits the left wall in each trial
+        """
+        self.frames = frames
+        self.offsets = offsets
+        self.start_paddles = start_paddles
+        self.hit_ys = hit_ys
+
+    def __len__(self) -> int:
+        return len(self.hit_ys)
+
+    @classmethod
+    def generate(cls, num_trials: int, seed: int):
+        """Calculates the ball's flight in num_trials seeded trials with BallFlight.
+
+        Args:
+            num_trials (int): how many trials to generate
+            seed (int): seed for the balls' random starting positions and bounces
+
+        Returns:
+            TrajectoryBank: the generated bank
+        """
+        rng = random.Random(seed)
+        frames = []
+        offsets = [0]
+        start_paddles = []
+        hit_ys = []
+        for _ in range(num_trials):
+            ball = Ball(rng)
+            angle = math.degrees(math.atan(ball.y_velocity / ball.x_velocity))
+            start_paddles.append(ball.y - angle / BALL_MAX_ANGLE * (PADDLE_HEIGHT / 2 + BALL_RADIUS) - PADDLE_HEIGHT / 2)
+            flight = BallFlight(ball)
+            frames.append(flight.states().astype(np.float32))
+            hit_ys.append(flight.hit_y)
+            offsets.append(offsets[-1] + len(flight))
+        return cls(np.concatenate(frames), np.array(offsets, dtype=np.int64), np.array(start_paddles), np.array(hit_ys))
+
+    @staticmethod
+    def key(num_trials: int, seed: int) -> np.ndarray:
+        """Identifies a bank by its trials and the game constants it was generated with, so a cached bank is only
+        reused if it would be generated exactly the same way again."""
+        return np.array([num_trials, seed, SCREEN_WIDTH, SCREEN_HEIGHT, BALL_RADIUS, PADDLE_WIDTH, PADDLE_HEIGHT,
+                         PADDLE_DIST_FROM_EDGE, BALL_START_SPEED, BALL_MAX_ANGLE], dtype=np.float64)
+
+    def save(self, path: str, key: np.ndarray):
+        """Saves the bank as .npy files in the directory path.
+
+        Args:
+            path (str): directory to save to
+            key (np.ndarray): TrajectoryBank.key of the bank
+        """
+        os.makedirs(path, exist_ok=True)
+        # the key is removed first and saved last, so a half written bank is never mistaken for a complete one
+        key_file = os.path.join(path, 'key.npy')
+        if os.path.exists(key_file):
+            os.remove(key_file)
+        for name, array in [('frames', self.frames), ('offsets', self.offsets), ('start_paddles', self.start_paddles),
+                            ('hit_ys', self.hit_ys), ('key', key)]:
+            # written next to the old file and then moved over it, so processes memory mapping the old file keep it
+            file = os.path.join(path, name + '.npy')
+            np.save(file + '.tmp.npy', array)
+            os.replace(file + '.tmp.npy', file)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        """Loads a bank saved with save.
+
+        Args:
+            path (str): directory the bank was saved to
+            mmap (bool, optional): memory map the frames instead of reading them into memory, so every process
+            shares one copy. Defaults to True.
+
+        Returns:
+            TrajectoryBank: the loaded bank
+        """
+        arrays = [np.load(os.path.join(path, name + '.npy'), mmap_mode='r' if mmap else None)
+                  for name in ('frames', 'offsets', 'start_paddles', 'hit_ys')]
+        return cls(*arrays)
+
+    @classmethod
+    def load_or_generate(cls, path: str, num_trials: int, seed: int):
+        """Loads the bank cached at path if it matches num_trials, seed and the game constants. Otherwise generates it
+        and caches it at path.
+
+        Args:
+            path (str): cache directory. None skips the cache.
+            num_trials (int): how many trials the bank needs
+            seed (int): seed of the bank
+
+        Returns:
+            TrajectoryBank: the bank
+        """
+        key = cls.key(num_trials, seed)
+        if path is None:
+            return cls.generate(num_trials, seed)
+        key_file = os.path.join(path, 'key.npy')
+        if not os.path.exists(key_file) or not np.array_equal(np.load(key_file), key):
+            cls.generate(num_trials, seed).save(path, key)
+        return cls.load(path)
+
+
+def do_bank_trial(neural_nets, bank: TrajectoryBank, trial_num: int) -> np.ndarray:
+    """Same as do_trial_vectorized, but the ball's flight is replayed from a TrajectoryBank instead of simulated.
+
+    Args:
+        neural_nets (Population | QuantizedPopulation | list[NeuralNetwork]): the neural networks to play the game
+        bank (TrajectoryBank): bank holding the trial
+        trial_num (int): which trial in the bank to play
+
+    Returns:
+        np.ndarray: reward value for each neural network determined by the distance to the ball's collision location.
+    """
+    population = Population(neural_nets) if isinstance(neural_nets, list) else neural_nets
+    frames = bank.frames[bank.offsets[trial_num]:bank.offsets[trial_num + 1]]
+    paddles = np.full(len(population), bank.start_paddles[trial_num])
+    inp = np.empty((len(population), 5))
+    for frame in frames:
+        inp[:, :4] = frame
+        inp[:, 4] = paddles + PADDLE_HEIGHT / 2
+        paddles = move_paddles(paddles, population.run(inp))
+    # reward closer paddles more heavily
+    return 1 - np.abs(paddles + PADDLE_HEIGHT / 2 - bank.hit_ys[trial_num]) / SCREEN_HEIGHT
+
+
+def do_bank_trial_jit(neural_nets, bank: TrajectoryBank, trial_num: int) -> np.ndarray:
+    """Same as do_bank_trial, with every paddle moved by kernels.paddle_trial. Same arguments and return value."""
+    population = Population(neural_nets) if isinstance(neural_nets, list) else neural_nets
+    frames = bank.frames[bank.offsets[trial_num]:bank.offsets[trial_num + 1]]
+    return kernels.paddle_trial(frames, float(bank.start_paddles[trial_num]), float(bank.hit_ys[trial_num]),
+                                population.genomes, np.array(population.layer_sizes), PHYSICS)
+
+
+# state each pool worker attaches to once in init_worker, instead of being sent the population with every task
+worker_state = {}
+
+
+def init_worker(population_name: str, rewards_name: str, num_agents: int, num_trials: int, bank=None,
+                profile_dir: str = None):
+    """Pool initializer. Attaches the worker to the shared population and reward matrix.
+
+    Args:
+        population_name (str): name of the SharedPopulation block
+        rewards_name (str): name of the shared (num_trials, num_agents) reward block
+        num_agents (int): number of networks the shared population holds
+        num_trials (int): number of trials per generation
+        bank (TrajectoryBank | str, optional): trajectory bank to replay trials from, or the directory of a cached one
+        to memory map. Defaults to None, which plays fresh random balls.
+        profile_dir (str, optional): profile every trial with cProfile and dump the stats into this directory when
+        the worker exits. Defaults to None, which does not profile.
+    """
+    worker_state['profiler'] = None
+    if profile_dir is not None:
+        worker_state['profiler'] = cProfile.Profile()
+        # runs when the pool is closed and the worker exits normally
+        multiprocessing.util.Finalize(None, worker_state['profiler'].dump_stats,
+                                      args=(os.path.join(profile_dir, f'worker-{os.getpid()}.pstats'),),
+                                      exitpriority=10)
+    worker_state['bank'] = TrajectoryBank.load(bank) if isinstance(bank, str) else bank
+    # forked workers start with identical random states and would otherwise all play the same balls
+    random.seed()
+    worker_state['population'] = SharedPopulation(num_agents, name=population_name)
+    worker_state['rewards_shm'], worker_state['rewards'] = shared_array((num_trials, num_agents), np.float32,
+                                                                        name=rewards_name)
+
+
+def do_shared_trial(version, trial_num):
+    """Runs one trial on the shared population and writes the rewards into row trial_num of the shared reward matrix.
+    Only the networks loaded for this generation are played, which may be fewer than NUM_AGENTS.
+
+    Args:
+        version (int): version of the generation the trial is for
+        trial_num (int): which trial this is
+
+    Returns:
+        tuple[int, int, float]: trial_num, the process id of the worker and the seconds it spent on the trial
+    """
+    start = time.perf_counter()
+    profiler = worker_state['profiler']
+    if profiler is not None:
+        profiler.enable()
+    shared = worker_state['population']
+    if shared.version != version:
+        raise RuntimeError(f'worker expected generation version {version} but found {shared.version}')
+    population = shared.active()
+    if worker_state['bank'] is not None:
+        trial = do_bank_trial_jit if jit_enabled() else do_bank_trial
+        worker_state['rewards'][trial_num, :len(population)] = trial(population, worker_state['bank'], trial_num)
+    else:
+        if jit_enabled():
+            trial = do_trial_jit
+        else:
+            trial = do_trial_vectorized if VECTORIZED_TRIALS else do_trial
+        worker_state['rewards'][trial_num, :len(population)] = trial(population, trial_num)
+    if profiler is not None:
+        profiler.disable()
+    return trial_num, os.getpid(), time.perf_counter() - start
+
+
+def stream_trials(pool, version: int, trial_nums, worker_times: dict = None, chunksize: int = 1):
+    """Starts playing trials of the generation loaded into the shared population on the pool and returns at once.
+
+    Args:
+        pool (multiprocessing.Pool): pool initialized with init_worker
+        version (int): version of the loaded generation
+        trial_nums (iterable): which trials to play
+        worker_times (dict, optional): the seconds each worker spent playing trials are added to this, by process id,
+        as the trials finish. Defaults to None.
+        chunksize (int, optional): trials sent to a worker at a time. Defaults to 1.
+
+    Returns:
+        generator: yields the number of every trial as soon as it finishes, in the order they finish. Its rewards are
+        in the shared reward matrix by then.
+    """
+    results = pool.imap_unordered(partial(do_shared_trial, version), trial_nums, chunksize=chunksize)
+
+    def finished():
+        for trial_num, pid, seconds in results:
+            if worker_times is not None:
+                worker_times[pid] = worker_times.get(pid, 0.0) + seconds
+            yield trial_num
+    return finished()
+
+
+def play_trials(pool, version: int, trial_nums, worker_times: dict = None, chunksize: int = 1):
+    """Plays trials of the generation loaded into the shared population on the pool and waits for all of them. Same
+    arguments as stream_trials."""
+    for _ in stream_trials(pool, version, trial_nums, worker_times, chunksize):
+        pass
+
+
+def race(pool, shared: SharedPopulation, rewards: np.ndarray, candidates: Population, version: int,
+         num_trials: int = TRIALS_PER_GEN, worker_times: dict = None, chunksize: int = 1):
+    """Evaluates candidates by racing (successive halving). Trials are played in rounds, and after each round only
+    the best RACING_KEEP of the remaining agents by mean reward play the next round. Of those, agents whose confidence
+    interval lies entirely below the SELECT_NUM-th best agent's are dropped as well, since they can't become elites.
+    At least SELECT_NUM agents always advance.
+
+    Args:
+        pool (multiprocessing.Pool): pool initialized with init_worker
+        shared (SharedPopulation): the shared population the pool reads from
+        rewards (np.ndarray): the shared reward matrix the pool writes to
+        candidates (Population): networks to evaluate
+        version (int): version number of the first round. Each round uses the next number.
+        num_trials (int, optional): most trials an agent plays. Defaults to TRIALS_PER_GEN.
+        worker_times (dict, optional): passed on to play_trials. Defaults to None.
+        chunksize (int, optional): passed on to play_trials. Defaults to 1.
+
+    Returns:
+        tuple: total reward and number of trials played for each candidate, the highest score (scaled to
+        num_trials trials) each candidate may have so agents dropped earlier always rank below agents that
+        advanced past them, and the next unused version number
+    """
+    totals = np.zeros(len(candidates))
+    squares = np.zeros(len(candidates))
+    trials = np.zeros(len(candidates), dtype=int)
+    dropped_round = np.full(len(candidates), -1)  # -1 for agents that were never dropped
+    alive = np.arange(len(candidates))
+    played = 0
+    round_trials = RACING_FIRST_ROUND
+    round_num = 0
+    while played < num_trials and len(alive) > 0:
+        round_trials = min(round_trials, num_trials - played)
+        shared.load(candidates.take(alive), version=version)
+        play_trials(pool, version, range(played, played + round_trials), worker_times, chunksize)
+        version += 1
+        round_rewards = rewards[played:played + round_trials, :len(alive)].astype(np.float64)
+        totals[alive] += round_rewards.sum(axis=0)
+        squares[alive] += (round_rewards ** 2).sum(axis=0)
+        trials[alive] += round_trials
+        played += round_trials
+        round_trials *= 2
+        if played >= num_trials:
+            break
+
+        means = totals[alive] / trials[alive]
+        errors = np.sqrt(np.maximum(squares[alive] / trials[alive] - means ** 2, 0) / trials[alive])
+        order = np.argsort(-means, kind='stable')
+        advancing = np.zeros(len(alive), dtype=bool)
+        advancing[order[:max(math.ceil(len(alive) * RACING_KEEP), SELECT_NUM)]] = True
+        # drop agents whose upper confidence bound can't reach the lower bound of the SELECT_NUM-th best agent
+        elite = order[min(SELECT_NUM, len(alive)) - 1]
+        advancing &= means + RACING_CONFIDENCE * errors >= means[elite] - RACING_CONFIDENCE * errors[elite]
+        dropped_round[alive[~advancing]] = round_num
+        alive = alive[advancing]
+        round_num += 1
+
+    # agents dropped in a round may not score higher than the worst agent that advanced past that round
+    estimates = totals * (num_trials / trials)
+    caps = np.full(len(candidates), np.inf)
+    for dropped in range(round_num - 1, -1, -1):
+        advanced = (dropped_round == -1) | (dropped_round > dropped)
+        caps[dropped_round == dropped] = np.minimum(estimates[advanced], caps[advanced]).min()
+    return totals, trials, caps, version
+
+
+class Evaluator:
+    def __init__(self, num_agents: int = NUM_AGENTS, num_trials: int = TRIALS_PER_GEN,
+                 processes: int = multiprocessing.cpu_count(), profile_dir: str = None):
+        """Scores generations of networks on a process pool. The population and rewards are shared with the workers,
+        so tasks only need to send a version and trial number. Every generation replays the same trials from the
+        trajectory bank (unless TRAJECTORY_SEED is None), so generations are compared on the same balls.
+
+        Args:
+            num_agents (int, optional): most networks evaluated at once. Defaults to NUM_AGENTS.
+            num_trials (int, optional): trials per generation. Defaults to TRIALS_PER_GEN.
+            processes (int, optional): number of worker processes. Defaults to every CPU core.
+            profile_dir (str, optional): passed on to init_worker. Defaults to None.
+        """
+        self.num_agents = num_agents
+        self.num_trials = num_trials
+        self.population = SharedPopulation(num_agents)
+        self.rewards_shm, self.rewards = shared_array((num_trials, num_agents), np.float32)
+        self.use_bank = TRAJECTORY_SEED is not None
+        bank = None
+        bank_frames = None
+        if self.use_bank:
+            bank = TrajectoryBank.load_or_generate(TRAJECTORY_BANK_PATH, num_trials, TRAJECTORY_SEED)
+            bank_frames = bank.frames  # memory mapped like the workers' if the bank is cached
+            if TRAJECTORY_BANK_PATH is not None:
+                bank = TRAJECTORY_BANK_PATH  # workers memory map the cached bank rather than each getting a copy
+        if jit_enabled():
+            # compile the kernels (or load them from numba's disk cache) once, before the workers are forked, for the
+            # frames the workers will play
+            kernels.warm_up(PHYSICS, layer_sizes_from_constants(), DTYPE, bank_frames)
+        self.pool = multiprocessing.Pool(processes, initializer=init_worker,
+                                         initargs=(self.population.name, self.rewards_shm.name, num_agents,
+                                                   num_trials, bank, profile_dir))
+        # the cache must at least fit one generation
+        self.cache = FitnessCache(max(FITNESS_CACHE_SIZE, num_agents)) if FITNESS_CACHE_SIZE > 0 else None
+        self.version = 0  # changes every time a new set of networks is loaded into the shared population
+        self.chunksize = max(1, num_trials // (processes * TRIAL_CHUNKS_PER_WORKER))
+        self.pending = None  # the networks passed to submit, until collect returns their scores
+        self.metrics = {}  # timings and counts of the last call to collect
+
+    def submit(self, games: Population):
+        """Starts scoring every network in games and returns without waiting, so the caller can do other work (like
+        saving the last generation) while the pool plays the trials. The scores are returned by collect. This will use
+        ALL of your CPU until the trials finish.
+
+        Args:
+            games (Population): networks to score
+        """
+        self.pending = {'games': games, 'start': time.perf_counter(), 'worker_times': {}, 'stream': None}
+        if self.cache is None:
+            evaluate = np.arange(len(games))
+        else:
+            # simulate each distinct genome once. With the trajectory bank every generation plays the same trials, so
+            # genomes already in the cache would score exactly the same again and are skipped. With fresh trials they
+            # are played again and the new trials are added to their old ones.
+            keys = [FitnessCache.key(genome) for genome in games.genomes]
+            first = {}
+            for i, key in enumerate(keys):
+                first.setdefault(key, i)
+            evaluate = np.array([i for key, i in first.items() if not self.use_bank or key not in self.cache],
+                                dtype=int)
+            self.pending.update(keys=keys, first=first)
+        self.pending['evaluate'] = evaluate
+
+        # racing has to see every round's results before starting the next one, so it only starts in collect
+        if not RACING and len(evaluate) > 0:
+            self.population.load(games.take(evaluate), version=self.version)
+            self.pending['stream'] = stream_trials(self.pool, self.version, range(self.num_trials),
+                                                   self.pending['worker_times'], self.chunksize)
+            self.version += 1
+
+    def collect(self) -> np.ndarray:
+        """Waits for the networks passed to submit to be scored. Rewards are added up as trials finish rather than
+        after the last one.
+
+        Returns:
+            np.ndarray: each network's score, its total reward scaled to num_trials trials
+        """
+        pending = self.pending
+        self.pending = None
+        games, evaluate, worker_times = pending['games'], pending['evaluate'], pending['worker_times']
+        timings = {}
+
+        if RACING:
+            totals, trials, caps, self.version = race(self.pool, self.population, self.rewards, games.take(evaluate),
+                                                      self.version, self.num_trials, worker_times, self.chunksize)
+            timings['evaluation'] = time.perf_counter() - pending['start']
+        else:
+            totals = np.zeros(len(evaluate))
+            if pending['stream'] is not None:
+                # rows are added in trial order, whatever order they finish in, so the totals don't depend on timing
+                finished = np.zeros(self.num_trials, dtype=bool)
+                next_row = 0
+                for trial_num in pending['stream']:
+                    finished[trial_num] = True
+                    with timed(timings, 'aggregation'):
+                        while next_row < self.num_trials and finished[next_row]:
+                            totals += self.rewards[next_row, :len(evaluate)]
+                            next_row += 1
+            timings['evaluation'] = time.perf_counter() - pending['start']
+            trials = np.full(len(evaluate), self.num_trials)
+            caps = np.full(len(evaluate), np.inf)
+
+        with timed(timings, 'aggregation'):
+            if self.cache is None:
+                scores = np.minimum(totals * (self.num_trials / trials), caps)
+            else:
+                keys, first = pending['keys'], pending['first']
+                # look every genome up before adding anything, so none of this generation's genomes are evicted
+                results = {key: self.cache.get(key) for key in first}
+                for i, total, trial_count in zip(evaluate, totals, trials):
+                    self.cache.add(keys[i], total, trial_count)
+                    results[keys[i]] = self.cache.get(keys[i])
+                # scale to num_trials trials so genomes with more trials are comparable to new ones
+                scores = np.array([results[key][0] * (self.num_trials / results[key][1]) for key in keys])
+                for i, cap in zip(evaluate, caps):
+                    scores[i] = min(scores[i], cap)
+
+        agent_trials = int(np.sum(trials))
+        self.metrics = {
+            'timings': timings,
+            'evaluated': len(evaluate),
+            'agent_trials': agent_trials,
+            'agent_trials_per_second': agent_trials / timings['evaluation'] if timings['evaluation'] > 0 else 0.0,
+            # fraction of the evaluation wall time each worker spent playing trials
+            'worker_utilization': {str(pid): seconds / timings['evaluation']
+                                   for pid, seconds in sorted(worker_times.items())},
+        }
+        return scores
+
+    def evaluate(self, games: Population) -> np.ndarray:
+        """Scores every network in games and waits for the scores, see submit and collect.
+
+        Args:
+            games (Population): networks to score
+
+        Returns:
+            np.ndarray: each network's score, its total reward scaled to num_trials trials
+        """
+        self.submit(games)
+        return self.collect()
+
+    def close(self):
+        """Shuts down the pool and frees the shared memory."""
+        self.pool.close()
+        self.pool.join()
+        self.population.close(unlink=True)
+        del self.rewards
+        self.rewards_shm.close()
+        self.rewards_shm.unlink()
+
+
+def next_generation(games: Population, scores: np.ndarray, rng: np.random.Generator,
+                    timings: dict = None) -> Population:
+    """Creates the next generation. The best SELECT_NUM networks advance unchanged and the rest are children of
+    parents picked with SELECTION, bred and mutated all at once.
+
+    Args:
+        games (Population): the current generation
+        scores (np.ndarray): every network's score
+        rng (np.random.Generator): random number generator for selection and breeding
+        timings (dict, optional): the seconds spent on selection and breeding are added to this. Defaults to None.
+
+    Returns:
+        Population: the next generation, with the elites first
+    """
+    if timings is None:
+        timings = {}
+    with timed(timings, 'selection'):
+        elites = np.argsort(-np.asarray(scores), kind='stable')[:SELECT_NUM]
+        num_children = len(games) - len(elites) - RANDOM_NETWORKS_PER_GEN
+        parents1, parents2 = select_parents(scores, num_children, rng, SELECTION, TOURNAMENT_SIZE)
+
+    with timed(timings, 'breeding'):
+        # breed every child at once, then mutate them. Elites advance unchanged.
+        children = mutate_population(crossover_population(games, parents1, parents2, rng), rng)
+        new_games = [games.take(elites), children]
+        if RANDOM_NETWORKS_PER_GEN > 0:
+            new_games.append(Population.random(RANDOM_NETWORKS_PER_GEN, rng))
+        return Population.concatenate(new_games)
+
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Train pong AIs with neuroevolution.')
+    parser.add_argument('--resume', nargs='?', const=CHECKPOINT_PATH, metavar='CHECKPOINT',
+                        help=f'continue training from a checkpoint (default: {CHECKPOINT_PATH})')
+    parser.add_argument('--profile', nargs='?', const=PROFILE_PATH, metavar='PATH',
+                        help=f'profile every pool worker with cProfile and save the merged stats (default: {PROFILE_PATH})')
+    parser.add_argument('--spectate', action='store_true', help='watch the champion play in a window while training')
+    args = parser.parse_args()
+
     best_nn = None
     best_score = -math.inf
 
-    pool = multiprocessing.Pool(multiprocessing.cpu_count())
+    rng = np.random.default_rng()
+    profile_dir = tempfile.mkdtemp(prefix='ai_pong_profile_') if args.profile else None
+    if SELF_PLAY:
+        # self_play.py plays by pong.py's rules, which imports pygame, so it is only imported when it is used
+        from self_play import SelfPlayEvaluator
+        evaluator = SelfPlayEvaluator(rng, SELF_PLAY_SCHEDULE)
+    else:
+        evaluator = Evaluator(profile_dir=profile_dir)
     
-    # starting networks
-    games = [NeuralNetwork() for _ in range(NUM_AGENTS)]
+    start_gen = 0
+    if args.resume:
+        # pick up exactly where the checkpoint left off, including the random number generators
+        checkpoint = load_checkpoint(args.resume)
+        games = Population.from_genomes(checkpoint['genomes'], checkpoint['layer_sizes'].tolist())
+        start_gen = int(checkpoint['generation'])
+        best_score = float(checkpoint['best_score'])
+        if checkpoint['best_genome'].size > 0:
+            best_nn = NeuralNetwork(checkpoint['best_genome'], checkpoint['layer_sizes'].tolist())
+        set_rng_states(str(checkpoint['rng_states']), rng)
+        if evaluator.cache is not None and 'cache_keys' in checkpoint:
+            # with fresh trials the cache holds every remembered genome's trials so far, which resuming must keep
+            evaluator.cache.set_state(checkpoint['cache_keys'], checkpoint['cache_results'])
+        print(f'Resuming from generation {start_gen + 1}')
+    else:
+        # starting networks
+        games = Population.random(NUM_AGENTS, rng)
+    checkpoints = CheckpointWriter(CHECKPOINT_PATH) if CHECKPOINT_EVERY > 0 else None
+    spectator = Spectator(watch_pong) if args.spectate else None
+    metrics = MetricsLog(METRICS_PATH, append=bool(args.resume)) if METRICS_PATH is not None else None
     
-    for gen in range(GENERATIONS):
-        # get rewards for each network. This will use ALL of your CPU for the duration of the runtime.
-        rewards = pool.map(partial(do_trial, games), range(TRIALS_PER_GEN))
-        # create game_score objects to sort and rank by.
-        game_scores = [[game, 0] for game in games]
-        for reward in rewards:
-            for i in range(len(reward)):
-                game_scores[i][1] += reward[i]
-            
-        game_scores.sort(key=lambda game: game[1], reverse=True)
-        if game_scores[0][1] > best_score:
-            best_score = game_scores[0][1]
-            best_nn = game_scores[0][0]
-            # save champion
-            with open('champion.pickle', 'wb') as f:
-                pickle.dump(best_nn, f)
-        
-        new_games = []
+    # generations are pipelined: each generation is submitted to the pool as soon as it is bred, and the previous
+    # generation's results are printed and saved while the workers play its trials
+    if start_gen < GENERATIONS:
+        evaluator.submit(games)
+    generation_start = time.perf_counter()
+    for gen in range(start_gen, GENERATIONS):
+        scores = evaluator.collect()
+        timings = dict(evaluator.metrics['timings'])
+        with timed(timings, 'sorting'):
+            # indices of the networks from best to worst score
+            ranking = np.argsort(-scores, kind='stable')
+        # self-play ratings are only relative to the generation they were played in, so every generation's best
+        # network is the new champion
+        new_champion = SELF_PLAY or scores[ranking[0]] > best_score
+        if new_champion:
+            best_score = scores[ranking[0]]
+            best_nn = games.network(ranking[0])
+
+        games = next_generation(games, scores, rng, timings)
+        if gen + 1 < GENERATIONS:
+            evaluator.submit(games)
+        metrics_row = {'generation': gen + 1, 'wall_time': time.perf_counter() - generation_start,
+                       **evaluator.metrics, 'timings': timings, 'fitness': fitness_stats(scores),
+                       'best_score': float(best_score)}
+        generation_start = time.perf_counter()
 
         print(f'Generation {gen + 1} results')
         for i in range(SELECT_NUM):
-            print(game_scores[i][1])
-            new_games.append(game_scores[i][0])
+            print(scores[ranking[i]])
         print('============================')
         sys.stdout.flush()
-        
-        # create next generation using tournament selection
-        while len(new_games) < NUM_AGENTS - RANDOM_NETWORKS_PER_GEN:
-            parent_1_options = random.sample(game_scores, TOURNAMENT_SIZE)
-            parent_2_options = random.sample(game_scores, TOURNAMENT_SIZE)
-
-            parent1 = max(parent_1_options, key=lambda x: x[1])
-            parent2 = max(parent_2_options, key=lambda x: x[1])
-            if parent1 == parent2:
-                continue
-            crossover_child = crossover(parent1[0], parent2[0])
-            new_games.append(crossover_child)
-
-        for i in range(RANDOM_NETWORKS_PER_GEN):
-            new_games.append(NeuralNetwork())
-        games = new_games
-        # save winner from last generation
-        with open('last_gen.pickle', 'wb') as f:
-            pickle.dump(games[0], f)
-
-    pool.close()
-    
+        if spectator is not None and best_nn is not None:
+            spectator.send(snapshot(best_nn, f'generation {gen + 1} champion, score {best_score:.2f}'))
+
+        with timed(timings, 'checkpoint'):
+            if new_champion:
+                # save champion
+                with open('champion.pickle', 'wb') as f:
+                    pickle.dump(best_nn, f)
+                export_policy(best_nn, 'champion.policy')
+            # save winner from last generation
+            with open('last_gen.pickle', 'wb') as f:
+                pickle.dump(games.network(0), f)
+            export_policy(games.network(0), 'last_gen.policy')
+
+            if checkpoints is not None and (gen + 1) % CHECKPOINT_EVERY == 0:
+                # games is already the next generation, so resuming starts by evaluating it
+                cache_keys, cache_results = (evaluator.cache.state() if evaluator.cache is not None
+                                             else (np.empty((0, 16), dtype=np.uint8), np.empty((0, 2))))
+                checkpoints.save(generation=gen + 1, genomes=games.genomes, layer_sizes=games.layer_sizes,
+                                 best_score=best_score,
+                                 best_genome=best_nn.genome if best_nn is not None else np.empty(0),
+                                 rng_states=rng_states(rng), cache_keys=cache_keys, cache_results=cache_results)
+
+        if metrics is not None:
+            metrics.write(metrics_row)
+
+    if checkpoints is not None:
+        checkpoints.close()
+    if spectator is not None:
+        spectator.close()
+    if metrics is not None:
+        metrics.close()
+    evaluator.close()
+    if profile_dir is not None:
+        stats = merge_profiles(profile_dir, args.profile)
+        shutil.rmtree(profile_dir)
+        if stats is not None:
+            print(f'Merged worker profiles saved to {args.profile}')
+            stats.sort_stats('cumulative').print_stats(20)
@@ -0,0 +1,92 @@
+import json
+import os
+import queue
+import random
+import threading
+import numpy as np
+
+
+def rng_states(rng: np.random.Generator) -> str:
+    """Returns the states of the random module and a numpy Generator as a JSON string, so they can be stored in a
+    checkpoint and restored with set_rng_states."""
+    version, internal_state, gauss_next = random.getstate()
+    return json.dumps({'random': [version, list(internal_state), gauss_next],
+                       'numpy': rng.bit_generator.state})
+
+
+def set_rng_states(states: str, rng: np.random.Generator):
+    """Restores random number generator states saved with rng_states.
+
+    Args:
+        states (str): JSON string returned by rng_states
+        rng (np.random.Generator): generator to restore the numpy state into
+    """
+    states = json.loads(states)
+    version, internal_state, gauss_next = states['random']
+    random.setstate((version, tuple(internal_state), gauss_next))
+    rng.bit_generator.state = states['numpy']
+
+
+def save_checkpoint(path: str, **arrays):
+    """Saves arrays to an .npz checkpoint. The file is written next to path and then moved over it, so a run killed
+    while saving never leaves a half written checkpoint behind.
+
+    Args:
+        path (str): where to save the checkpoint
+        **arrays: arrays (or values numpy can turn into arrays) to save
+    """
+    temp_path = path + '.tmp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, path)
+
+
+def load_checkpoint(path: str) -> dict:
+    """Loads a checkpoint saved with save_checkpoint.
+
+    Args:
+        path (str): checkpoint file
+
+    Returns:
+        dict: the saved arrays by name
+    """
+    with np.load(path) as checkpoint:
+        return {name: checkpoint[name] for name in checkpoint.files}
+
+
+class CheckpointWriter:
+    def __init__(self, path: str):
+        """Saves checkpoints on a background thread, so training never waits on the disk. If a new checkpoint arrives
+        while the previous one is still waiting to be written, only the newest one is kept.
+
+        Args:
+            path (str): where to save checkpoints
+        """
+        self.path = path
+        self.pending = queue.Queue(maxsize=1)
+        self.thread = threading.Thread(target=self._write_loop, daemon=True)
+        self.thread.start()
+
+    def _write_loop(self):
+        while True:
+            arrays = self.pending.get()
+            if arrays is None:
+                return
+            save_checkpoint(self.path, **arrays)
+
+    def save(self, **arrays):
+        """Queues a checkpoint to be saved. Arrays are copied, so the caller may keep modifying them.
+
+        Args:
+            **arrays: arrays (or values numpy can turn into arrays) to save
+        """
+        arrays = {name: np.array(value) for name, value in arrays.items()}
+        try:
+            self.pending.get_nowait()  # replace a checkpoint that has not started being written yet
+        except queue.Empty:
+            pass
+        self.pending.put(arrays)
+
+    def close(self):
+        """Waits for queued checkpoints to be written and stops the background thread."""
+        self.pending.put(None)
+        self.thread.join()
@@ -0,0 +1,78 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+
+class FitnessCache:
+    def __init__(self, max_size: int):
+        """Remembers the total reward and number of trials of genomes that have already been evaluated, so elites and
+        duplicate children do not have to be simulated again. The least recently used genomes are forgotten once more
+        than max_size are stored.
+
+        Args:
+            max_size (int): most genomes to remember
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()  # key -> [total reward, number of trials]
+
+    @staticmethod
+    def key(genome: np.ndarray) -> bytes:
+        """Returns the cache key of a genome, a hash of its parameter bytes."""
+        return hashlib.blake2b(np.ascontiguousarray(genome).tobytes(), digest_size=16).digest()
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: bytes) -> tuple[float, int]:
+        """Returns the total reward and number of trials stored for key, or (0, 0) if it is not stored.
+
+        Args:
+            key (bytes): key of the genome
+
+        Returns:
+            tuple[float, int]: total reward and number of trials
+        """
+        if key not in self.entries:
+            return 0.0, 0
+        self.entries.move_to_end(key)
+        total, trials = self.entries[key]
+        return total, trials
+
+    def add(self, key: bytes, total: float, trials: int):
+        """Adds newly simulated trials to a genome's stored results, evicting the least recently used genomes if the
+        cache is full.
+
+        Args:
+            key (bytes): key of the genome
+            total (float): total reward of the new trials
+            trials (int): number of new trials
+        """
+        old_total, old_trials = self.get(key)
+        self.entries[key] = [old_total + total, old_trials + trials]
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def state(self) -> tuple[np.ndarray, np.ndarray]:
+        """Returns every stored genome as arrays for a checkpoint, from least to most recently used.
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: (N, 16) uint8 array of keys and (N, 2) array of total rewards and trials
+        """
+        keys = np.frombuffer(b''.join(self.entries), dtype=np.uint8).reshape(len(self.entries), 16)
+        results = np.array(list(self.entries.values()), dtype=np.float64).reshape(len(self.entries), 2)
+        return keys, results
+
+    def set_state(self, keys: np.ndarray, results: np.ndarray):
+        """Replaces the stored genomes with ones returned by state.
+
+        Args:
+            keys (np.ndarray): (N, 16) uint8 array of keys
+            results (np.ndarray): (N, 2) array of total rewards and trials
+        """
+        self.entries = OrderedDict()
+        for key, (total, trials) in zip(keys, results):
+            self.add(key.tobytes(), float(total), int(trials))
@@ -0,0 +1,264 @@
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import time
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # pong.py imports pygame, but nothing is ever drawn here
+from nn import NeuralNetwork
+from pong import Ball, Paddle, PADDLE_HEIGHT, SCREEN_HEIGHT, SCREEN_WIDTH, load_ai
+
+# headless version of pong.py for evaluating AIs without a display. Matches are played with the same Ball.update rules
+# as pong.py, as fast as possible instead of at 60 frames per second.
+MATCHES = 1000  # how many matches to play
+POINTS_TO_WIN = 5  # a match is won by the first player to score this many points
+MAX_RALLY_HITS = 50  # a rally still going after this many hits is abandoned without a point and served again
+MAX_POINTS = 2 * POINTS_TO_WIN  # a match still going after this many points (including abandoned ones) is a draw
+AIM_ERROR = 45  # scripted players aim up to this many pixels away from the ball, so that they miss now and then
+
+
+class NetworkPlayer:
+    def __init__(self, network, side: str):
+        """Plays a paddle with a neural network trained by ai_pong.py. Networks are always trained on the left paddle,
+        so on the right the game is mirrored before the network sees it.
+
+        Args:
+            network (NeuralNetwork | function): the network, or a function running it like pong.load_ai returns
+            side (str): 'l' or 'r'
+        """
+        self.run = network if callable(network) else lambda *inp: network.run(inp)
+        self.side = side
+
+    def move(self, ball: Ball, paddle: Paddle, left_paddle: Paddle, right_paddle: Paddle):
+        """Moves paddle for this frame. Same inputs and actions as the AI player in pong.py.
+
+        Args:
+            ball (Ball): the ball
+            paddle (Paddle): this player's paddle
+            left_paddle (Paddle): the left paddle
+            right_paddle (Paddle): the right paddle
+        """
+        if self.side == 'l':
+            inp = [ball.x, ball.y, ball.x_velocity, ball.y_velocity, paddle.y + PADDLE_HEIGHT / 2]
+        else:
+            inp = [SCREEN_WIDTH - ball.x, ball.y, -ball.x_velocity, ball.y_velocity, paddle.y + PADDLE_HEIGHT / 2]
+        up, down = self.run(*inp)
+        if up > 0 and not down > 0:
+            paddle.move_up()
+        if down > 0 and not up > 0:
+            paddle.move_down()
+
+
+class TrackingPlayer:
+    def __init__(self, side: str, rng: random.Random = random):
+        """Scripted player that keeps its paddle centered on the ball's current height, give or take an aim error
+        that is picked again every time the ball turns towards it.
+
+        Args:
+            side (str): 'l' or 'r'
+            rng (random.Random, optional): where the aim errors come from. Defaults to the random module.
+        """
+        self.side = side
+        self.rng = rng
+        self.approaching = False
+        self.error = 0
+
+    def move(self, ball: Ball, paddle: Paddle, left_paddle: Paddle, right_paddle: Paddle):
+        """Moves paddle towards target_y for this frame."""
+        approaching = (ball.x_velocity < 0) == (self.side == 'l')
+        if approaching and not self.approaching:
+            self.error = self.rng.uniform(-AIM_ERROR, AIM_ERROR)
+        self.approaching = approaching
+        self.follow(paddle, self.target_y(ball, left_paddle, right_paddle) + self.error)
+
+    def target_y(self, ball: Ball, left_paddle: Paddle, right_paddle: Paddle) -> float:
+        return ball.y
+
+    @staticmethod
+    def follow(paddle: Paddle, y: float):
+        """Moves paddle's center towards y, without overshooting it by more than a frame's movement."""
+        center = paddle.y + PADDLE_HEIGHT / 2
+        if y < center - PADDLE_HEIGHT / 4:
+            paddle.move_up()
+        elif y > center + PADDLE_HEIGHT / 4:
+            paddle.move_down()
+
+
+class PredictingPlayer(TrackingPlayer):
+    def __init__(self, side: str, rng: random.Random = random):
+        """Scripted player that moves to where the ball will reach its paddle (using Ball.predict_collision), give or
+        take an aim error, and returns to the middle while the ball is heading away.
+
+        Args:
+            side (str): 'l' or 'r'
+            rng (random.Random, optional): where the aim errors come from. Defaults to the random module.
+        """
+        super().__init__(side, rng)
+
+    def target_y(self, ball: Ball, left_paddle: Paddle, right_paddle: Paddle) -> float:
+        if not self.approaching:
+            return SCREEN_HEIGHT / 2
+        return ball.predict_collision(left_paddle, right_paddle)[1]
+
+
+# scripted players that can be chosen by name instead of a network file
+SCRIPTED_PLAYERS = {'track': TrackingPlayer, 'predict': PredictingPlayer}
+
+
+def make_player(spec, side: str, rng: random.Random = random):
+    """Creates a player from a spec.
+
+    Args:
+        spec (str | NeuralNetwork): the name of a scripted player in SCRIPTED_PLAYERS, the path of a policy file or
+        pickled network, or a network
+        side (str): 'l' or 'r'
+        rng (random.Random, optional): random number generator of scripted players. Defaults to the random module.
+
+    Returns:
+        NetworkPlayer | TrackingPlayer: the player
+    """
+    if isinstance(spec, NeuralNetwork):
+        return NetworkPlayer(spec, side)
+    if spec in SCRIPTED_PLAYERS:
+        return SCRIPTED_PLAYERS[spec](side, rng)
+    return NetworkPlayer(load_ai(spec), side)
+
+
+def play_point(left, right, rng: random.Random) -> tuple[str, int, int]:
+    """Plays a single point of pong.py, from the serve until someone scores.
+
+    Args:
+        left (NetworkPlayer | TrackingPlayer): left player
+        right (NetworkPlayer | TrackingPlayer): right player
+        rng (random.Random): where the serve's random numbers come from
+
+    Returns:
+        tuple[str, int, int]: 'l' or 'r' for whoever scored (None if the rally was abandoned after MAX_RALLY_HITS),
+        the number of times the ball was hit and the number of frames played
+    """
+    ball = Ball(rng)
+    left_paddle = Paddle('l')
+    right_paddle = Paddle('r')
+    hits = 0
+    frames = 0
+    while hits < MAX_RALLY_HITS:
+        left.move(ball, left_paddle, left_paddle, right_paddle)
+        right.move(ball, right_paddle, left_paddle, right_paddle)
+        direction = ball.x_velocity > 0
+        scorer = ball.update(left_paddle, right_paddle)
+        frames += 1
+        if scorer is not None:
+            return scorer, hits, frames
+        if (ball.x_velocity > 0) != direction:
+            hits += 1
+    return None, hits, frames
+
+
+def play_match(left, right, rng: random.Random) -> dict:
+    """Plays a match to POINTS_TO_WIN points.
+
+    Args:
+        left (NetworkPlayer | TrackingPlayer): left player
+        right (NetworkPlayer | TrackingPlayer): right player
+        rng (random.Random): where the serves' random numbers come from
+
+    Returns:
+        dict: the winner ('l', 'r' or None for a draw), each side's points, the hits of every rally and the number of
+        frames played
+    """
+    points = {'l': 0, 'r': 0}
+    rallies = []
+    frames = 0
+    while max(points.values()) < POINTS_TO_WIN and len(rallies) < MAX_POINTS:
+        scorer, hits, point_frames = play_point(left, right, rng)
+        if scorer is not None:
+            points[scorer] += 1
+        rallies.append(hits)
+        frames += point_frames
+    winner = None
+    if max(points.values()) >= POINTS_TO_WIN:
+        winner = 'l' if points['l'] > points['r'] else 'r'
+    return {'winner': winner, 'left_points': points['l'], 'right_points': points['r'], 'rallies': rallies,
+            'frames': frames}
+
+
+def play_matches(left_spec, right_spec, seed: int, num_matches: int) -> list[dict]:
+    """Plays num_matches matches between two players. Used as a pool task, so the players are given as specs.
+
+    Args:
+        left_spec (str | NeuralNetwork): left player, see make_player
+        right_spec (str | NeuralNetwork): right player, see make_player
+        seed (int): seed of the serves
+        num_matches (int): how many matches to play
+
+    Returns:
+        list[dict]: the result of every match, see play_match
+    """
+    rng = random.Random(seed)
+    left = make_player(left_spec, 'l', rng)
+    right = make_player(right_spec, 'r', rng)
+    return [play_match(left, right, rng) for _ in range(num_matches)]
+
+
+def evaluate(left_spec, right_spec, num_matches: int = MATCHES, seed: int = 0,
+             processes: int = multiprocessing.cpu_count()) -> dict:
+    """Plays num_matches matches between two players split across a process pool and summarizes the results.
+
+    Args:
+        left_spec (str | NeuralNetwork): left player, see make_player
+        right_spec (str | NeuralNetwork): right player, see make_player
+        num_matches (int, optional): how many matches to play. Defaults to MATCHES.
+        seed (int, optional): seed of the serves. The same seed and number of processes replay the same serves.
+        Defaults to 0.
+        processes (int, optional): number of worker processes. Defaults to every CPU core.
+
+    Returns:
+        dict: win rates, points and rally length statistics of the matches
+    """
+    # one task per process, each playing its share of the matches with its own seed
+    chunks = [num_matches // processes + (i < num_matches % processes) for i in range(processes)]
+    tasks = [(left_spec, right_spec, seed * processes + i, chunk) for i, chunk in enumerate(chunks) if chunk > 0]
+    with multiprocessing.Pool(len(tasks)) as pool:
+        matches = [match for results in pool.starmap(play_matches, tasks) for match in results]
+
+    rallies = [hits for match in matches for hits in match['rallies']]
+    return {
+        'matches': len(matches),
+        'left_win_rate': sum(match['winner'] == 'l' for match in matches) / len(matches),
+        'right_win_rate': sum(match['winner'] == 'r' for match in matches) / len(matches),
+        'draw_rate': sum(match['winner'] is None for match in matches) / len(matches),
+        'left_points': statistics.mean(match['left_points'] for match in matches),
+        'right_points': statistics.mean(match['right_points'] for match in matches),
+        'rally_mean': statistics.mean(rallies),
+        'rally_median': statistics.median(rallies),
+        'rally_max': max(rallies),
+        'frames': sum(match['frames'] for match in matches),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Play many headless pong.py matches and report the results.')
+    parser.add_argument('--left', default='champion.policy',
+                        help='left player: a policy file, a pickled network or one of ' + ', '.join(SCRIPTED_PLAYERS)
+                             + ' (default: champion.policy)')
+    parser.add_argument('--right', default='predict',
+                        help='right player: a policy file, a pickled network or one of ' + ', '.join(SCRIPTED_PLAYERS)
+                             + ' (default: predict)')
+    parser.add_argument('--matches', type=int, default=MATCHES, help=f'matches to play (default: {MATCHES})')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the serves (default: 0)')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='worker processes (default: every CPU core)')
+    args = parser.parse_args()
+
+    start = time.time()
+    results = evaluate(args.left, args.right, args.matches, args.seed, args.processes)
+    elapsed = time.time() - start
+    print(f'{args.left} (left) vs {args.right} (right), {results["matches"]} matches to {POINTS_TO_WIN}')
+    print(f'left wins: {results["left_win_rate"]:.1%}, right wins: {results["right_win_rate"]:.1%}, '
+          f'draws: {results["draw_rate"]:.1%}')
+    print(f'average score: {results["left_points"]:.2f} - {results["right_points"]:.2f}')
+    print(f'hits per rally: mean {results["rally_mean"]:.2f}, median {results["rally_median"]}, '
+          f'max {results["rally_max"]}')
+    print(f'{results["frames"]} frames in {elapsed:.2f}s ({results["frames"] / elapsed:.0f} frames per second)')
+    sys.stdout.flush()
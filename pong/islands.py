@@ -0,0 +1,175 @@
+import multiprocessing
+import pickle
+import queue
+import random
+import sys
+import numpy as np
+from nn import NeuralNetwork, Population, layer_sizes_from_constants
+from policy import export_policy
+from ai_pong import (GENERATIONS, NUM_AGENTS, SELECT_NUM, TOURNAMENT_SIZE, TRAJECTORY_BANK_PATH, TRAJECTORY_SEED,
+                     TRIALS_PER_GEN, VECTORIZED_TRIALS, TrajectoryBank, do_bank_trial, do_trial, do_trial_vectorized,
+                     next_generation)
+
+# island model version of ai_pong.py. The population is split into ISLANDS sub-populations that each evolve in their own
+# process with ai_pong.py's selection and breeding, and never wait for each other. Every MIGRATION_INTERVAL generations
+# each island sends copies of its best MIGRANTS networks to its neighbors and takes in whatever migrants have arrived.
+# Training constants (GENERATIONS, TRIALS_PER_GEN, SELECT_NUM, ...) are the ones in ai_pong.py.
+ISLANDS = multiprocessing.cpu_count()  # how many sub-populations evolve in parallel, one process each
+ISLAND_AGENTS = max(NUM_AGENTS // ISLANDS, SELECT_NUM + TOURNAMENT_SIZE)  # networks on each island
+MIGRATION_INTERVAL = 5  # islands exchange migrants every this many generations
+MIGRANTS = 2  # how many of its best networks an island sends to each neighbor
+TOPOLOGY = 'ring'  # which islands migrants go to, a key of TOPOLOGIES
+ISLAND_SEED = None  # seed of the islands' random number generators. None seeds them randomly.
+
+
+def ring(index: int, num_islands: int, rng: np.random.Generator) -> list[int]:
+    """Each island sends to the next one, and the last to the first."""
+    return [(index + 1) % num_islands] if num_islands > 1 else []
+
+
+def fully_connected(index: int, num_islands: int, rng: np.random.Generator) -> list[int]:
+    """Each island sends to every other island."""
+    return [i for i in range(num_islands) if i != index]
+
+
+def random_neighbor(index: int, num_islands: int, rng: np.random.Generator) -> list[int]:
+    """Each island sends to one other island picked at random every migration."""
+    others = [i for i in range(num_islands) if i != index]
+    return [others[rng.integers(len(others))]] if others else []
+
+
+# migration topologies: functions returning the islands an island sends its migrants to
+TOPOLOGIES = {'ring': ring, 'full': fully_connected, 'random': random_neighbor}
+
+
+def evaluate_island(games: Population, bank: TrajectoryBank) -> np.ndarray:
+    """Scores every network on an island by its total reward over TRIALS_PER_GEN trials, played in this process.
+
+    Args:
+        games (Population): the island's networks
+        bank (TrajectoryBank): bank to replay trials from. None plays fresh random balls.
+
+    Returns:
+        np.ndarray: each network's score
+    """
+    scores = np.zeros(len(games))
+    for trial_num in range(TRIALS_PER_GEN):
+        if bank is not None:
+            scores += do_bank_trial(games, bank, trial_num)
+        else:
+            scores += (do_trial_vectorized if VECTORIZED_TRIALS else do_trial)(games, trial_num)
+    return scores
+
+
+def migrate(games: Population, index: int, inboxes: list, rng: np.random.Generator) -> int:
+    """Sends copies of an island's first MIGRANTS networks (its elites, since next_generation puts them first) to its
+    neighbors, then replaces its last networks with the migrants that have arrived from other islands. Neither step
+    waits: migrants that haven't arrived yet are taken in at a later migration.
+
+    Args:
+        games (Population): the island's next generation. Migrants are written into it.
+        index (int): which island this is
+        inboxes (list[multiprocessing.Queue]): every island's queue of arriving migrants
+        rng (np.random.Generator): random number generator of the topology
+
+    Returns:
+        int: how many migrants were taken in
+    """
+    for neighbor in TOPOLOGIES[TOPOLOGY](index, len(inboxes), rng):
+        inboxes[neighbor].put(games.genomes[:MIGRANTS].copy())
+
+    arrivals = []
+    while True:
+        try:
+            arrivals.append(inboxes[index].get_nowait())
+        except queue.Empty:
+            break
+    if not arrivals:
+        return 0
+    # the newest migrants replace children at the end of the generation, never the elites
+    migrants = np.concatenate(arrivals)[-(len(games) - SELECT_NUM):]
+    games.genomes[len(games) - len(migrants):] = migrants
+    return len(migrants)
+
+
+def run_island(index: int, seed: np.random.SeedSequence, inboxes: list, results):
+    """Evolves one island for GENERATIONS generations. Runs in its own process.
+
+    Args:
+        index (int): which island this is
+        seed (np.random.SeedSequence): seed of the island's random number generators
+        inboxes (list[multiprocessing.Queue]): every island's queue of arriving migrants
+        results (multiprocessing.Queue): every generation (index, generation, best score, best genome, migrants taken
+        in) is put here, and (index, None, ...) once the island is done
+    """
+    rng = np.random.default_rng(seed)
+    # fresh random balls come from the random module, which every forked island would otherwise share the state of
+    random.seed(int(seed.generate_state(1)[0]))
+    bank = TrajectoryBank.load(TRAJECTORY_BANK_PATH) if TRAJECTORY_SEED is not None else None
+    games = Population.random(ISLAND_AGENTS, rng)
+    for gen in range(GENERATIONS):
+        scores = evaluate_island(games, bank)
+        best = int(np.argmax(scores))
+        best_genome = games.genomes[best].copy()
+
+        games = next_generation(games, scores, rng)
+        immigrants = 0
+        if (gen + 1) % MIGRATION_INTERVAL == 0 and gen + 1 < GENERATIONS:
+            immigrants = migrate(games, index, inboxes, rng)
+        results.put((index, gen, scores[best], best_genome, immigrants))
+
+    # migrants still on their way to islands that have finished would keep this process from exiting
+    for inbox in inboxes:
+        inbox.cancel_join_thread()
+    results.put((index, None, None, None, 0))
+
+
+if __name__ == '__main__':
+    if TRAJECTORY_SEED is not None:
+        if TRAJECTORY_BANK_PATH is None:
+            sys.exit('islands.py needs TRAJECTORY_BANK_PATH so the islands can share the trajectory bank')
+        # generate the bank once so the islands only have to memory map it
+        TrajectoryBank.load_or_generate(TRAJECTORY_BANK_PATH, TRIALS_PER_GEN, TRAJECTORY_SEED)
+
+    inboxes = [multiprocessing.Queue() for _ in range(ISLANDS)]
+    results = multiprocessing.Queue()
+    seeds = np.random.SeedSequence(ISLAND_SEED).spawn(ISLANDS)
+    islands = [multiprocessing.Process(target=run_island, args=(i, seeds[i], inboxes, results), daemon=True)
+               for i in range(ISLANDS)]
+    for island in islands:
+        island.start()
+
+    # merge the islands' results as they arrive. With the trajectory bank every island plays the same trials, so
+    # their scores can be compared directly.
+    layer_sizes = layer_sizes_from_constants()
+    best_score = -np.inf
+    last_gen = [None] * ISLANDS  # [score, genome] of every island's newest generation
+    running = ISLANDS
+    while running > 0:
+        index, gen, score, genome, immigrants = results.get()
+        if gen is None:
+            running -= 1
+            continue
+        last_gen[index] = [score, genome]
+        if score > best_score:
+            best_score = score
+            # save champion
+            champion = NeuralNetwork(genome, layer_sizes)
+            with open('champion.pickle', 'wb') as f:
+                pickle.dump(champion, f)
+            export_policy(champion, 'champion.policy')
+        print(f'Island {index + 1} generation {gen + 1}: {score}' +
+              (f' ({immigrants} migrants arrived)' if immigrants else ''))
+        sys.stdout.flush()
+
+    for island in islands:
+        island.join()
+
+    # save the best network of the islands' last generations
+    score, genome = max(last_gen, key=lambda result: result[0])
+    winner = NeuralNetwork(genome, layer_sizes)
+    with open('last_gen.pickle', 'wb') as f:
+        pickle.dump(winner, f)
+    export_policy(winner, 'last_gen.policy')
+    print('============================')
+    print(f'Champion: {best_score}, best of the last generations: {score}')
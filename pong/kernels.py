@@ -0,0 +1,191 @@
+import math
+import sys
+from collections import namedtuple
+import numpy as np
+
+# compiled trial kernels for ai_pong.py. If numba is installed the kernels below are compiled to native loops the first
+# time they are called, and cached on disk (in __pycache__) so later runs and pool workers don't compile them again.
+# Without numba they are plain Python functions that give the same results, just much slower, so ai_pong.py only uses
+# them when NUMBA_AVAILABLE is True.
+try:
+    import numba
+    NUMBA_AVAILABLE = True
+except ImportError:
+    numba = None
+    NUMBA_AVAILABLE = False
+
+# the largest input math.exp doesn't overflow for. numpy's exp gives inf above it, so its sigmoid gives exactly 0.
+EXP_LIMIT = math.log(sys.float_info.max)
+
+
+def jit(function=None, inline: bool = False):
+    """Compiles function with numba when it is installed, caching the compiled code on disk. Otherwise returns function
+    unchanged. Use as @jit, or @jit(inline=True) for small functions called in hot loops, which numba then compiles into
+    their callers."""
+    if function is None:
+        return lambda function: jit(function, inline)
+    if not NUMBA_AVAILABLE:
+        return function
+    return numba.njit(cache=True, nogil=True, inline='always' if inline else 'never')(function)
+
+
+# the game constants the kernels need. Passed in as an argument rather than read from ai_pong.py, so the kernels don't
+# import it and changed constants never hit a stale cached kernel.
+Physics = namedtuple('Physics', ['screen_width', 'screen_height', 'ball_radius', 'paddle_width', 'paddle_height',
+                                 'paddle_dist_from_edge', 'ball_start_speed', 'paddle_speed'])
+
+
+@jit
+def ball_flight(x: float, y: float, x_velocity: float, y_velocity: float, return_angle: float, physics: Physics):
+    """Steps a trial's ball frame by frame with the same arithmetic as ai_pong.Ball.update, until it reaches the left
+    paddle.
+
+    Args:
+        x (float): x coordinate of the freshly created ball
+        y (float): y coordinate of the ball
+        x_velocity (float): x velocity of the ball
+        y_velocity (float): y velocity of the ball
+        return_angle (float): angle in degrees the right paddle returns the ball at, the value Ball.collision_right
+        draws
+        physics (Physics): the game constants
+
+    Returns:
+        tuple[np.ndarray, float]: the ball's (x, y, x velocity, y velocity) at the start of every frame, including the
+        frame it reaches the left paddle on, and where it hits the left paddle
+    """
+    left_paddle = physics.paddle_dist_from_edge + physics.paddle_width
+    right_paddle = physics.screen_width - left_paddle
+    radius = physics.ball_radius
+    capacity = 256
+    frames = np.empty((capacity, 4))
+    count = 0
+    while True:
+        if count == capacity:
+            capacity *= 2
+            grown = np.empty((capacity, 4))
+            grown[:count] = frames[:count]
+            frames = grown
+        frames[count, 0] = x
+        frames[count, 1] = y
+        frames[count, 2] = x_velocity
+        frames[count, 3] = y_velocity
+        count += 1
+
+        moved_proportion = 0.0
+        if (x + x_velocity + radius >= right_paddle or x + x_velocity - radius <= left_paddle) \
+                and x + radius <= right_paddle and x - radius >= left_paddle:
+            if x + x_velocity + radius >= right_paddle:
+                # Ball.collision_right
+                ball_slope = y_velocity / x_velocity
+                y = y + ball_slope * (physics.screen_width - physics.paddle_dist_from_edge - physics.paddle_width
+                                      - (x + radius))
+                x = physics.screen_width - physics.paddle_dist_from_edge - physics.paddle_width - radius
+                x_velocity = math.cos(math.radians(return_angle)) * physics.ball_start_speed
+                y_velocity = math.sin(math.radians(return_angle)) * physics.ball_start_speed
+                moved_proportion = (right_paddle - (x + radius)) / x_velocity
+            else:
+                # Ball.collision_left
+                ball_slope = y_velocity / x_velocity
+                hit_y = y + ball_slope * (left_paddle + radius - (x - radius))
+                return frames[:count], hit_y
+
+        x += x_velocity * (1 - moved_proportion)
+        y += y_velocity * (1 - moved_proportion)
+        new_y = max(radius, min(physics.screen_height - radius, y))
+        if new_y != y:
+            y -= 2 * (y - new_y)
+            y_velocity *= -1
+        else:
+            y = new_y
+
+
+@jit(inline=True)
+def run_network(genome: np.ndarray, layer_sizes: np.ndarray, values: np.ndarray, scratch: np.ndarray):
+    """Runs one network like nn.NeuralNetwork.run, with plain loops over its genome. Each node's inputs are added up in
+    the same order as numpy does for these small layers.
+
+    Args:
+        genome (np.ndarray): the network's parameters
+        layer_sizes (np.ndarray): number of nodes in every layer
+        values (np.ndarray): the inputs. Overwritten with the outputs, so it must fit the largest layer.
+        scratch (np.ndarray): working space the size of the largest layer
+    """
+    offset = 0
+    for layer in range(len(layer_sizes) - 1):
+        rows = layer_sizes[layer]
+        cols = layer_sizes[layer + 1]
+        for j in range(cols):
+            total = 0.0
+            for i in range(rows):
+                total += values[i] * genome[offset + i * cols + j]
+            total += genome[offset + rows * cols + j]
+            if layer != len(layer_sizes) - 2:
+                # numpy's sigmoid gives exactly 0 where math.exp would overflow
+                total = 1 / (1 + math.exp(-total)) if -total <= EXP_LIMIT else 0.0
+            scratch[j] = total
+        for j in range(cols):
+            values[j] = scratch[j]
+        offset += (rows + 1) * cols
+
+
+@jit
+def paddle_trial(frames: np.ndarray, start_paddle: float, hit_y: float, genomes: np.ndarray, layer_sizes: np.ndarray,
+                 physics: Physics) -> np.ndarray:
+    """Plays a trial with every network, each moving its own paddle, like ai_pong.do_bank_trial.
+
+    Args:
+        frames (np.ndarray): the ball's (x, y, x velocity, y velocity) at the start of every frame
+        start_paddle (float): y coordinate every paddle starts at
+        hit_y (float): where the ball hits the left paddle
+        genomes (np.ndarray): (N, P) array holding one network's genome per row
+        layer_sizes (np.ndarray): number of nodes in every layer
+        physics (Physics): the game constants
+
+    Returns:
+        np.ndarray: reward value for each network determined by the distance to the ball's collision location
+    """
+    widest = layer_sizes.max()
+    values = np.empty(widest)
+    scratch = np.empty(widest)
+    rewards = np.empty(genomes.shape[0])
+    for agent in range(genomes.shape[0]):
+        genome = genomes[agent]
+        paddle = start_paddle
+        for frame in range(frames.shape[0]):
+            for i in range(4):
+                values[i] = frames[frame, i]
+            values[4] = paddle + physics.paddle_height / 2
+            run_network(genome, layer_sizes, values, scratch)
+            up = values[0] > 0
+            down = values[1] > 0
+            if up and not down:
+                paddle = max(paddle - physics.paddle_speed, 0)
+            if down and not up:
+                paddle = min(paddle + physics.paddle_speed, physics.screen_height - physics.paddle_height)
+        # reward closer paddles more heavily
+        rewards[agent] = 1 - abs(paddle + physics.paddle_height / 2 - hit_y) / physics.screen_height
+    return rewards
+
+
+def warm_up(physics: Physics, layer_sizes: list[int], dtype=np.float64, bank_frames: np.ndarray = None):
+    """Calls every kernel once on a tiny made-up trial, so they are compiled (or loaded from the disk cache) before a
+    process pool is forked and every worker starts with them ready. numba compiles a kernel once per argument type, so
+    paddle_trial is compiled for ball_flight's frames and, if given, for frames like a trajectory bank's.
+
+    Args:
+        physics (Physics): the game constants
+        layer_sizes (list[int]): number of nodes in every layer of the networks that will be played
+        dtype (np.dtype, optional): dtype of the networks' genomes. Defaults to np.float64.
+        bank_frames (np.ndarray, optional): a trajectory bank's frames, e.g. a read-only float32 memory map. Defaults
+        to None.
+    """
+    frames, hit_y = ball_flight(physics.screen_width / 2, physics.screen_height / 2, physics.ball_start_speed, 0.0,
+                                180.0, physics)
+    num_params = sum((layer_sizes[i] + 1) * layer_sizes[i + 1] for i in range(len(layer_sizes) - 1))
+    genomes = np.zeros((1, num_params), dtype=dtype)
+    paddle_trial(frames, 0.0, hit_y, genomes, np.array(layer_sizes), physics)
+    if bank_frames is not None:
+        # same dtype and writeability as the bank's frames, so it has the same numba type
+        like_bank = frames.astype(bank_frames.dtype)
+        like_bank.setflags(write=bank_frames.flags.writeable)
+        paddle_trial(like_bank, 0.0, hit_y, genomes, np.array(layer_sizes), physics)
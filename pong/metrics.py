@@ -0,0 +1,67 @@
+import glob
+import json
+import os
+import pstats
+import time
+from contextlib import contextmanager
+import numpy as np
+
+
+@contextmanager
+def timed(timings: dict, name: str):
+    """Adds the wall time spent inside the with block to timings[name], in seconds.
+
+    Args:
+        timings (dict): where the time is added
+        name (str): which entry to add it to
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def fitness_stats(scores: np.ndarray) -> dict:
+    """Returns summary statistics of a generation's scores."""
+    scores = np.asarray(scores, dtype=np.float64)
+    return {'best': float(scores.max()), 'mean': float(scores.mean()), 'median': float(np.median(scores)),
+            'std': float(scores.std()), 'worst': float(scores.min())}
+
+
+class MetricsLog:
+    def __init__(self, path: str, append: bool = False):
+        """Writes one JSON object per generation to a JSON lines file. Every line is flushed as soon as it is written,
+        so the file can be followed while training runs.
+
+        Args:
+            path (str): the JSON lines file
+            append (bool, optional): keep the lines already in the file, e.g. when resuming. Defaults to False.
+        """
+        self.file = open(path, 'a' if append else 'w')
+
+    def write(self, record: dict):
+        """Writes a record as one line."""
+        self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def merge_profiles(directory: str, path: str) -> pstats.Stats:
+    """Merges the cProfile stats every pool worker dumped into directory and saves them as one file.
+
+    Args:
+        directory (str): directory holding one .pstats file per worker
+        path (str): where to save the merged stats
+
+    Returns:
+        pstats.Stats: the merged stats, or None if no worker dumped any
+    """
+    files = sorted(glob.glob(os.path.join(directory, '*.pstats')))
+    if not files:
+        return None
+    stats = pstats.Stats(*files)
+    stats.dump_stats(path)
+    return stats
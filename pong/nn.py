@@ -1,7 +1,6 @@
 import numpy as np
 from typing import Union
 import time
-from copy import deepcopy
 import random
 
 INPUT_NODES = 5
@@ -12,21 +11,82 @@ MUTATION_RATE = .05  # how often a weight or bias is modified when mutation occu
 REPLACEMENT_RATE = .005  # how often a weight or bias is completely replaced. This is dependent on MUTATION_RATE occuring first.
 STD = .01  # standard deviation of modification value to weights or biases.
 
+DTYPE = np.float64  # dtype every weight and bias is stored in
+
+
+def layer_sizes_from_constants() -> list[int]:
+    """Returns the number of nodes in every layer, from the static variables declared at the top of the file."""
+    return [INPUT_NODES] + HIDDEN_LAYER_NODES + [OUTPUT_NODES]
+
+
+def genome_length(layer_sizes: list[int]) -> int:
+    """Returns how many weights and biases a network with the given layer sizes has."""
+    return sum((layer_sizes[i] + 1) * layer_sizes[i + 1] for i in range(len(layer_sizes) - 1))
+
+
+def layer_views(genome: np.ndarray, layer_sizes: list[int]) -> tuple[list[np.ndarray], list[np.ndarray]]:
+    """Splits a genome into per layer weights and biases without copying. The genome stores each layer's weights
+    (row major) followed by its biases, one layer after another.
+
+    Args:
+        genome (np.ndarray): one network's parameters with shape (P,), or a population's with shape (N, P)
+        layer_sizes (list[int]): number of nodes in every layer, including the input and output layers
+
+    Returns:
+        tuple[list[np.ndarray], list[np.ndarray]]: views of the weights, shape ([N,] in, out), and biases, shape
+        ([N,] out), of every layer
+    """
+    weights = []
+    biases = []
+    offset = 0
+    for i in range(len(layer_sizes) - 1):
+        rows, cols = layer_sizes[i], layer_sizes[i + 1]
+        weights.append(genome[..., offset:offset + rows * cols].reshape(genome.shape[:-1] + (rows, cols)))
+        offset += rows * cols
+        biases.append(genome[..., offset:offset + cols])
+        offset += cols
+    return weights, biases
+
+
 class NeuralNetwork:
-    def __init__(self):
+    # weights and biases are views into genome, so all parameters are stored in one contiguous array
+    __slots__ = ('layer_sizes', 'genome', 'weights', 'biases')
+
+    def __init__(self, genome: np.ndarray = None, layer_sizes: list[int] = None):
         """
         Initializes neural network with parameters set to the static variables declared at the top of the file
+
+        Args:
+            genome (np.ndarray, optional): parameters to use instead of random ones. Defaults to None.
+            layer_sizes (list[int], optional): number of nodes in every layer. Defaults to the static variables.
+        """
+        self.layer_sizes = list(layer_sizes) if layer_sizes is not None else layer_sizes_from_constants()
+        if genome is None:
+            # initialize weights and biases randomly between -1 and 1 with a uniform distribution
+            genome = np.random.uniform(-1, 1, size=genome_length(self.layer_sizes)).astype(DTYPE)
+        self.genome = genome
+        self.weights, self.biases = layer_views(genome, self.layer_sizes)
+
+    def __getstate__(self):
+        return {'layer_sizes': self.layer_sizes, 'genome': self.genome}
+
+    def __setstate__(self, state: dict):
+        """Rebuilds the network from a pickle. Networks pickled before the genome existed (for example older
+        champion.pickle and last_gen.pickle files) stored separate weights and biases lists, which are packed into a
+        genome here.
         """
-        previous_layer_nodes = INPUT_NODES
-        self.weights = []
-        self.biases = []
-        # initialize weights and biases randomly between -1 and 1 with a uniform distribution
-        for i in range(len(HIDDEN_LAYER_NODES)):
-            self.weights.append(np.random.uniform(-1, 1, size=(previous_layer_nodes, HIDDEN_LAYER_NODES[i])))
-            self.biases.append(np.random.uniform(-1, 1, size=HIDDEN_LAYER_NODES[i]))
-            previous_layer_nodes = HIDDEN_LAYER_NODES[i]
-        self.weights.append(np.random.uniform(-1, 1, size=(previous_layer_nodes, OUTPUT_NODES)))
-        self.biases.append(np.random.uniform(-1, 1, size=OUTPUT_NODES))
+        if 'genome' not in state:
+            weights = state['weights']
+            biases = state['biases']
+            layer_sizes = [weights[0].shape[0]] + [layer.shape[1] for layer in weights]
+            genome = np.concatenate([np.concatenate([weights[i].ravel(), biases[i].ravel()])
+                                     for i in range(len(weights))]).astype(DTYPE)
+            state = {'layer_sizes': layer_sizes, 'genome': genome}
+        self.__init__(state['genome'], state['layer_sizes'])
+
+    def copy(self) -> 'NeuralNetwork':
+        """Returns an independent copy of the network."""
+        return NeuralNetwork(self.genome.copy(), self.layer_sizes)
 
     def run(self, data: list[float]) -> Union[float, list[float]]:
         """Runs data through the neural network and returns the value in the output node(s)
@@ -50,7 +110,7 @@ class NeuralNetwork:
         Returns:
             NeuralNetwork: mutated network
         """
-        new_network = deepcopy(self)
+        new_network = self.copy()
         for i in range(len(new_network.weights)):
             adjustments = np.zeros_like(new_network.weights[i])
             for row in adjustments:
@@ -70,7 +130,7 @@ class NeuralNetwork:
 def crossover(parent1, parent2):
     """Performs uniform crossover using given parents to create and return child neural network object.
     Parents must be NeuralNetwork objects."""
-    child = deepcopy(parent1)
+    child = parent1.copy()
     for i in range(len(child.weights)):
         for row in range(child.weights[i].shape[0]):
             for col in range(child.weights[i].shape[1]):
@@ -83,6 +143,165 @@ def crossover(parent1, parent2):
     return child
 
 
+class Population:
+    def __init__(self, networks: list[NeuralNetwork]):
+        """Stacks the genomes of every network into one (N, P) array so the whole population can be run in one batched
+        call.
+
+        Args:
+            networks (list[NeuralNetwork]): networks to stack. All networks must share the same layer sizes.
+        """
+        self.set_genomes(np.stack([network.genome for network in networks]), networks[0].layer_sizes)
+
+    def set_genomes(self, genomes: np.ndarray, layer_sizes: list[int]):
+        """Uses genomes as the population's parameters, with per layer weights and biases as views into it.
+
+        Args:
+            genomes (np.ndarray): (N, P) array holding one network's genome per row
+            layer_sizes (list[int]): number of nodes in every layer
+        """
+        self.layer_sizes = list(layer_sizes)
+        self.genomes = genomes
+        self.weights, self.biases = layer_views(genomes, self.layer_sizes)
+
+    @classmethod
+    def from_genomes(cls, genomes: np.ndarray, layer_sizes: list[int] = None):
+        """Creates a population directly from a genome array.
+
+        Args:
+            genomes (np.ndarray): (N, P) array holding one network's genome per row. Used as is, not copied.
+            layer_sizes (list[int], optional): number of nodes in every layer. Defaults to the static variables.
+
+        Returns:
+            Population: population using genomes
+        """
+        population = Population.__new__(Population)
+        population.set_genomes(genomes, layer_sizes if layer_sizes is not None else layer_sizes_from_constants())
+        return population
+
+    @classmethod
+    def random(cls, num_agents: int, rng: np.random.Generator):
+        """Creates num_agents random networks the same way NeuralNetwork does, with every parameter drawn uniformly
+        between -1 and 1.
+
+        Args:
+            num_agents (int): how many networks to create
+            rng (np.random.Generator): random number generator to draw from
+
+        Returns:
+            Population: the random networks
+        """
+        layer_sizes = layer_sizes_from_constants()
+        genomes = rng.uniform(-1, 1, size=(num_agents, genome_length(layer_sizes))).astype(DTYPE)
+        return cls.from_genomes(genomes, layer_sizes)
+
+    @classmethod
+    def concatenate(cls, populations: list):
+        """Joins several populations into one, in order.
+
+        Args:
+            populations (list[Population]): populations to join
+
+        Returns:
+            Population: the joined population
+        """
+        return cls.from_genomes(np.concatenate([p.genomes for p in populations]), populations[0].layer_sizes)
+
+    def take(self, indices) -> 'Population':
+        """Returns a new population made of copies of the networks at indices, in that order.
+
+        Args:
+            indices (array-like): which networks to copy. May repeat.
+
+        Returns:
+            Population: the selected networks
+        """
+        return Population.from_genomes(self.genomes[np.asarray(indices, dtype=int)], self.layer_sizes)
+
+    def astype(self, dtype) -> 'Population':
+        """Returns a copy of the population stored and run in another precision, e.g. np.float32. run computes in the
+        dtype of the genomes, so this is how a population's inference precision is chosen without changing DTYPE.
+
+        Args:
+            dtype (np.dtype): float dtype of the copy
+
+        Returns:
+            Population: the converted networks
+        """
+        return Population.from_genomes(self.genomes.astype(dtype), self.layer_sizes)
+
+    def __len__(self) -> int:
+        return self.genomes.shape[0]
+
+    def run(self, data) -> np.ndarray:
+        """Runs data through every network in the population at once. Gives the same values as calling
+        NeuralNetwork.run on each network individually.
+
+        Args:
+            data (array-like): either a single input row shared by every network or one input row per network, shape
+            (N, INPUT_NODES).
+
+        Returns:
+            np.ndarray: array of shape (N, OUTPUT_NODES) holding the output of each network.
+        """
+        data = np.asarray(data, dtype=self.genomes.dtype)
+        if data.ndim == 1:
+            data = np.broadcast_to(data, (len(self), data.shape[0]))
+        # same layers as NeuralNetwork.run, but every agent multiplies its own row by its own weights
+        for i in range(len(self.weights)):
+            data = np.matmul(data[:, None, :], self.weights[i])[:, 0, :] + self.biases[i]
+            if i != len(self.weights) - 1:
+                data = 1 / (1 + np.exp(-data))
+        return data
+
+    def network(self, index: int) -> NeuralNetwork:
+        """Returns a standalone copy of one network in the population.
+
+        Args:
+            index (int): which network to copy
+
+        Returns:
+            NeuralNetwork: copy of the network at index
+        """
+        return NeuralNetwork(self.genomes[index].copy(), self.layer_sizes)
+
+
+def crossover_population(population: Population, parents1, parents2, rng: np.random.Generator) -> Population:
+    """Performs uniform crossover for a whole generation at once. Child i takes each weight and bias from
+    population[parents1[i]] or population[parents2[i]] with equal chance, like crossover.
+
+    Args:
+        population (Population): population the parents come from
+        parents1 (array-like): index of each child's first parent
+        parents2 (array-like): index of each child's second parent
+        rng (np.random.Generator): random number generator to draw from
+
+    Returns:
+        Population: one child per pair of parents
+    """
+    first = population.genomes[np.asarray(parents1, dtype=int)]
+    second = population.genomes[np.asarray(parents2, dtype=int)]
+    return Population.from_genomes(np.where(rng.random(first.shape) < 0.5, second, first), population.layer_sizes)
+
+
+def mutate_population(population: Population, rng: np.random.Generator) -> Population:
+    """Performs NeuralNetwork.mutate on every network in the population at once and returns the mutated networks as a
+    new Population.
+
+    Args:
+        population (Population): networks to mutate
+        rng (np.random.Generator): random number generator to draw from
+
+    Returns:
+        Population: mutated networks
+    """
+    genomes = population.genomes
+    mutated = rng.random(genomes.shape) < MUTATION_RATE
+    replaced = rng.random(genomes.shape) < REPLACEMENT_RATE
+    adjustments = np.where(replaced, rng.uniform(-1, 1, genomes.shape), rng.normal(0, STD, genomes.shape))
+    return Population.from_genomes((genomes + np.where(mutated, adjustments, 0)).astype(genomes.dtype),
+                                   population.layer_sizes)
+
 if __name__ == '__main__':
     networks = [NeuralNetwork() for _ in range(1000)]
     start = time.time()
@@ -0,0 +1,129 @@
+import math
+import struct
+import sys
+
+# a policy file stores a network's layer sizes and parameters in a compact, versioned binary format that can be loaded
+# without numpy or nn.py. Layout (little-endian):
+#   magic      8 bytes   b'NNPOLICY'
+#   version    uint16    POLICY_VERSION
+#   activation uint8     hidden layer activation, see ACTIVATIONS. The output layer has none.
+#   float type 1 byte    b'd' for float64 or b'f' for float32 parameters
+#   num layers uint16    number of layers, including the input and output layers
+#   layer sizes          uint16 per layer
+#   parameters           one float per weight and bias, in genome order (each layer's weights row major, then its biases)
+POLICY_MAGIC = b'NNPOLICY'
+POLICY_VERSION = 1
+ACTIVATIONS = {'sigmoid': 0, 'relu': 1}
+HEADER = struct.Struct('<8sHBcH')
+
+
+def export_policy(network, path: str, activation: str = 'sigmoid', float_type: str = 'd'):
+    """Saves a NeuralNetwork as a policy file.
+
+    Args:
+        network (NeuralNetwork): network to save
+        path (str): where to save it
+        activation (str, optional): the network's hidden layer activation, a key of ACTIVATIONS. Defaults to
+        'sigmoid', which pong's networks use.
+        float_type (str, optional): 'd' to store float64 parameters or 'f' for float32. Defaults to 'd'.
+    """
+    layer_sizes = list(network.layer_sizes)
+    genome = [float(value) for value in network.genome]
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(POLICY_MAGIC, POLICY_VERSION, ACTIVATIONS[activation], float_type.encode(),
+                            len(layer_sizes)))
+        f.write(struct.pack(f'<{len(layer_sizes)}H', *layer_sizes))
+        f.write(struct.pack(f'<{len(genome)}{float_type}', *genome))
+
+
+def read_policy(path: str) -> tuple[list[int], str, list[float]]:
+    """Reads a policy file.
+
+    Args:
+        path (str): the policy file
+
+    Returns:
+        tuple[list[int], str, list[float]]: the layer sizes, hidden layer activation and parameters
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, version, activation, float_type, num_layers = HEADER.unpack_from(data)
+    if magic != POLICY_MAGIC:
+        raise ValueError(f'{path} is not a policy file')
+    if version != POLICY_VERSION:
+        raise ValueError(f'{path} is policy version {version}, but only version {POLICY_VERSION} can be loaded')
+    offset = HEADER.size
+    layer_sizes = list(struct.unpack_from(f'<{num_layers}H', data, offset))
+    offset += 2 * num_layers
+    num_params = sum((layer_sizes[i] + 1) * layer_sizes[i + 1] for i in range(num_layers - 1))
+    params = list(struct.unpack_from(f'<{num_params}{float_type.decode()}', data, offset))
+    activation = {code: name for name, code in ACTIVATIONS.items()}[activation]
+    return layer_sizes, activation, params
+
+
+def sigmoid(x: float) -> float:
+    try:
+        return 1 / (1 + math.exp(-x))
+    except OverflowError:
+        return 0.0  # math.exp raises exactly where numpy's exp gives inf and its sigmoid exactly 0
+
+
+def relu(x: float) -> float:
+    return x if x > 0 else 0.0
+
+
+def build_policy(layer_sizes: list[int], activation: str, params: list[float]):
+    """Builds a pure Python function that runs the network. Every weight and bias is written into the function's source
+    as a constant, and every layer is unrolled, so running it is just float arithmetic.
+
+    Args:
+        layer_sizes (list[int]): number of nodes in every layer
+        activation (str): hidden layer activation, a key of ACTIVATIONS
+        params (list[float]): the network's parameters in genome order
+
+    Returns:
+        function: takes one argument per input node and returns a tuple holding the output of every output node, the
+        same values as NeuralNetwork.run
+    """
+    inputs = [f'x{i}' for i in range(layer_sizes[0])]
+    lines = [f'def policy({", ".join(inputs)}):']
+    offset = 0
+    for layer in range(len(layer_sizes) - 1):
+        rows, cols = layer_sizes[layer], layer_sizes[layer + 1]
+        weights = params[offset:offset + rows * cols]
+        biases = params[offset + rows * cols:offset + (rows + 1) * cols]
+        offset += (rows + 1) * cols
+        outputs = [f'l{layer}_{j}' for j in range(cols)]
+        last = layer == len(layer_sizes) - 2
+        for j in range(cols):
+            total = ' + '.join(f'{inputs[i]} * {weights[i * cols + j]!r}' for i in range(rows))
+            value = f'({total}) + {biases[j]!r}'
+            lines.append(f'    {outputs[j]} = {value if last else f"{activation}({value})"}')
+        inputs = outputs
+    lines.append(f'    return ({", ".join(inputs)},)')
+    namespace = {'sigmoid': sigmoid, 'relu': relu}
+    exec('\n'.join(lines), namespace)
+    return namespace['policy']
+
+
+def load_policy(path: str):
+    """Loads a policy file as a pure Python function, see build_policy.
+
+    Args:
+        path (str): the policy file
+
+    Returns:
+        function: the network
+    """
+    return build_policy(*read_policy(path))
+
+
+if __name__ == '__main__':
+    # convert pickled networks to policy files, e.g. python3 policy.py champion.pickle last_gen.pickle
+    import pickle
+    for pickle_path in sys.argv[1:]:
+        with open(pickle_path, 'rb') as f:
+            network = pickle.load(f)
+        policy_path = pickle_path.rsplit('.', 1)[0] + '.policy'
+        export_policy(network, policy_path)
+        print(f'{pickle_path} -> {policy_path}')
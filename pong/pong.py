@@ -2,6 +2,8 @@ import pygame
 import random
 import math
 import pickle
+from policy import load_policy
+from walls import fold_y
 
 # changing any of these will change something about the game.
 # any changes within reason will not cause an error (something like making the games width smaller than the paddle's width might cause a problem)
@@ -24,6 +26,7 @@ BALL_MAX_ANGLE = 75
 PADDLE_SPEED = 3
 
 AI_PLAYER = True
+AI_PATH = 'last_gen.policy'  # the AI to play against: a policy file saved by policy.py or a pickled NeuralNetwork
 
 left_score = 0
 right_score = 0
@@ -60,9 +63,13 @@ class Paddle:
         self.y = min(self.y + PADDLE_SPEED, SCREEN_HEIGHT - PADDLE_HEIGHT)
 
 class Ball:
-    def __init__(self):
+    def __init__(self, rng: random.Random = random):
         """Creates centered Ball object with random starting velocity.
+
+        Args:
+            rng (random.Random, optional): where the ball's random numbers come from. Defaults to the random module.
         """
+        self.rng = rng
         self.x = SCREEN_WIDTH / 2
         self.y = SCREEN_HEIGHT / 2
         self.randomize_start_vel()
@@ -70,8 +77,8 @@ class Ball:
     def randomize_start_vel(self):
         """Randomizes start velocity for ball up to BALL_START_ANGLE
         """
-        angle = random.randint(-BALL_START_ANGLE, BALL_START_ANGLE)
-        if random.random() < .5:
+        angle = self.rng.randint(-BALL_START_ANGLE, BALL_START_ANGLE)
+        if self.rng.random() < .5:
             angle += 180
         angle = math.radians(angle)
         self.x_velocity = BALL_START_SPEED * math.cos(angle)
@@ -86,18 +93,19 @@ class Ball:
             right_paddle (Paddle): the right paddle object.
 
         Returns:
-            bool: True if someone scored
+            str: 'l' if the left player scored, 'r' if the right player scored, otherwise None
         """
         moved_proportion = 0  # at the beginning the ball has not moved at all
         # this gets called if the ball could possibly collide with a paddle.
         if (self.x + self.x_velocity + BALL_RADIUS >= right_paddle.x or self.x + self.x_velocity - BALL_RADIUS <= left_paddle.x + PADDLE_WIDTH) \
             and self.x + BALL_RADIUS <= right_paddle.x and self.x - BALL_RADIUS >= left_paddle.x + PADDLE_WIDTH:
-            # see if ball collided or was missed
-            res = self.collision_right(right_paddle) if self.x + self.x_velocity + BALL_RADIUS >= right_paddle.x else self.collision_left(left_paddle)
-            if res:
-                return True
+            # see if ball collided or was missed. The side is decided before the collision changes the ball's velocity.
+            right_side = self.x + self.x_velocity + BALL_RADIUS >= right_paddle.x
+            res = self.collision_right(right_paddle) if right_side else self.collision_left(left_paddle)
+            if res is not None:
+                return res
             # how much the ball will have moved when it hits a paddle
-            moved_proportion (right_paddle.x - (self.x + BALL_RADIUS)) / self.x_velocity if self.x + self.x_velocity + BALL_RADIUS >= right_paddle.x else ((self.x - BALL_RADIUS) - (left_paddle.x + PADDLE_WIDTH)) / self.x_velocity
+            moved_proportion = (right_paddle.x - (self.x + BALL_RADIUS)) / self.x_velocity if right_side else ((self.x - BALL_RADIUS) - (left_paddle.x + PADDLE_WIDTH)) / self.x_velocity
 
         # move remaining amount (which is all if the ball did not hit a paddle)
         self.x += self.x_velocity * (1 - moved_proportion)
@@ -109,7 +117,7 @@ class Ball:
             self.y_velocity *= -1
         else:
             self.y = new_y
-        return False
+        return None
         
     def collision_right(self, right_paddle):
         """Handles collision on right side
@@ -118,7 +126,7 @@ class Ball:
             right_paddle (Paddle): the right paddle
 
         Returns:
-            bool: True if left scored.
+            str: 'l' if left scored, otherwise None.
         """
         ball_slope = self.y_velocity / self.x_velocity
         collision_y = self.y + ball_slope * (right_paddle.x - (self.x + BALL_RADIUS))
@@ -136,12 +144,9 @@ class Ball:
         
         # this is for if the ball was missed
         else:
-            global left_score
-            left_score += 1
-            print("Left scored!")
-            return True
+            return 'l'
     
-        return False
+        return None
 
     def collision_left(self, left_paddle):
         """Handles collision on left side
@@ -150,7 +155,7 @@ class Ball:
             left_paddle (Paddle): the left paddle
 
         Returns:
-            bool: True if right scored.
+            str: 'r' if right scored, otherwise None.
         """
         ball_slope = self.y_velocity / self.x_velocity
         collision_y = self.y + ball_slope * (left_paddle.x + PADDLE_WIDTH - (self.x - BALL_RADIUS))
@@ -168,26 +173,68 @@ class Ball:
         
         # this is for if the ball was missed
         else:
-            global right_score
-            right_score += 1
-            print("Right scored!")
-            return True
+            return 'r'
         
-        return False
+        return None
     
+    def predict_collision(self, left_paddle, right_paddle):
+        """Calculates when and where update will next reach the plane of a paddle without stepping frame by frame, by
+        folding the ball's straight line flight across the top and bottom walls.
+
+        Args:
+            left_paddle (Paddle): the left paddle object
+            right_paddle (Paddle): the right paddle object
+
+        Returns:
+            tuple[int, float]: number of frames the ball moves freely before the frame it reaches the paddle plane on,
+            and the y coordinate it reaches the plane at.
+        """
+        # update collides on the first frame where x + x_velocity reaches the paddle plane. Reaching it exactly counts,
+        # so allow for rounding error when the ball lands right on the plane.
+        if self.x_velocity > 0:
+            frames = math.ceil((right_paddle.x - BALL_RADIUS - self.x) / self.x_velocity - 1 - 1e-9)
+        else:
+            frames = math.ceil((self.x - BALL_RADIUS - (left_paddle.x + PADDLE_WIDTH)) / -self.x_velocity - 1 - 1e-9)
+        frames = max(frames, 0)
+
+        x = self.x + frames * self.x_velocity
+        y, direction = fold_y(self.y + frames * self.y_velocity, self.y_velocity, SCREEN_HEIGHT, BALL_RADIUS)
+        ball_slope = self.y_velocity * direction / self.x_velocity
+        # same extrapolation as collision_right and collision_left
+        if self.x_velocity > 0:
+            return frames, y + ball_slope * (right_paddle.x - (x + BALL_RADIUS))
+        return frames, y + ball_slope * (left_paddle.x + PADDLE_WIDTH - (x - BALL_RADIUS))
+
     def draw(self, window):
         pygame.draw.circle(window, BALL_COLOR, (self.x, self.y), BALL_RADIUS)
 
 
+def load_ai(path: str):
+    """Loads the AI player.
+
+    Args:
+        path (str): a policy file (see policy.py), or a pickled NeuralNetwork
+
+    Returns:
+        function: takes the network's inputs as arguments and returns its (up, down) outputs
+    """
+    if path.endswith('.policy'):
+        return load_policy(path)
+    # pickles need nn.py and numpy, so they are only imported for them
+    from nn import Population
+    with open(path, 'rb') as f:
+        population = Population([pickle.load(f)])
+    return lambda *inp: population.run(inp)[0]
+
+
 if __name__ == '__main__':
     # from PyGame website
     pygame.init()
     screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
     pygame.display.set_caption("Bryce Ruben: Final Pong")
     clock = pygame.time.Clock()
-    # to use champion.pickle or last_gen.pickle, set their filepath below.
-    with open('last_gen.pickle', 'rb') as champ:
-        ai = pickle.load(champ)
+    # to use champion.policy or last_gen.policy (or their pickles), set AI_PATH.
+    ai = load_ai(AI_PATH)
 
     # set up game
     ball = Ball()
@@ -209,8 +256,7 @@ if __name__ == '__main__':
                 left_paddle.move_down()
         else:
             # run inputs through neural network to get action
-            inp = [ball.x, ball.y, ball.x_velocity, ball.y_velocity, left_paddle.y + PADDLE_HEIGHT / 2] 
-            up, down = ai.run(inp)
+            up, down = ai(ball.x, ball.y, ball.x_velocity, ball.y_velocity, left_paddle.y + PADDLE_HEIGHT / 2)
             if up > 0 and not down > 0:
                 left_paddle.move_up()
             if down > 0 and not up > 0:
@@ -220,7 +266,14 @@ if __name__ == '__main__':
         if keys[pygame.K_DOWN]:
             right_paddle.move_down()
 
-        if ball.update(left_paddle, right_paddle):
+        scorer = ball.update(left_paddle, right_paddle)
+        if scorer is not None:
+            if scorer == 'l':
+                left_score += 1
+                print("Left scored!")
+            else:
+                right_score += 1
+                print("Right scored!")
             print(f"Right: {right_score}\nLeft: {left_score}")
             ball = Ball()
             left_paddle = Paddle('l')
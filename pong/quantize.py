@@ -0,0 +1,201 @@
+import argparse
+import pickle
+import sys
+import time
+import numpy as np
+from nn import Population
+from ai_pong import PADDLE_HEIGHT, TRAJECTORY_SEED, TrajectoryBank, do_bank_trial, move_paddles
+
+# int8 inference for pong networks. Weights are stored as int8 with one scale per node of every network, and each
+# layer's inputs are quantized to int8 with scales calibrated on the inputs the networks actually see in trials.
+QUANT_MAX = 127  # largest magnitude of a quantized value
+CALIBRATION_TRIALS = 20  # bank trials played to collect calibration inputs
+REPORT_TRIALS = 100  # bank trials played by the agreement report
+
+
+class QuantizedPopulation:
+    def __init__(self, population: Population, input_scales: list[np.ndarray]):
+        """Quantizes a population's weights to int8.
+
+        Every input of every layer has its own activation scale (the largest magnitude it reached during calibration,
+        divided by QUANT_MAX). The scales are folded into the weights, (x / s) @ (s * W) == x @ W, so the ball's
+        position, its velocity and the paddle each use the full int8 range even though they differ in magnitude by
+        orders of magnitude. Each node of each network then gets one weight scale for its folded incoming weights.
+        Products of int8 values are summed in int32, like an int8 kernel would, and biases stay in float32.
+
+        Args:
+            population (Population): networks to quantize
+            input_scales (list[np.ndarray]): activation scale of every input of every layer, see calibrate
+        """
+        self.layer_sizes = population.layer_sizes
+        self.input_scales = [np.asarray(scales, dtype=np.float32) for scales in input_scales]
+        self.weights = []  # int8, shape (N, in, out)
+        self.weight_scales = []  # float32, shape (N, out)
+        self.biases = []  # float32, shape (N, out)
+        for i in range(len(population.weights)):
+            folded = population.weights[i] * self.input_scales[i][:, None]
+            scales = np.abs(folded).max(axis=1) / QUANT_MAX
+            scales[scales == 0] = 1
+            self.weights.append(np.rint(folded / scales[:, None, :]).astype(np.int8))
+            self.weight_scales.append(scales.astype(np.float32))
+            self.biases.append(population.biases[i].astype(np.float32))
+
+    @classmethod
+    def calibrate(cls, population: Population, inputs: np.ndarray) -> 'QuantizedPopulation':
+        """Quantizes a population with activation scales calibrated on inputs. Every network in the population is run
+        on the inputs in full precision and the largest magnitude each input of each layer reaches is recorded.
+
+        Args:
+            population (Population): networks to quantize
+            inputs (np.ndarray): (M, INPUT_NODES) array of network inputs, for example from collect_inputs
+
+        Returns:
+            QuantizedPopulation: the quantized networks
+        """
+        peaks = [np.abs(inputs).max(axis=0)]
+        # running every network on every input would be M * N rows, so each network gets an equal share of them
+        rows = -(-len(inputs) // len(population)) * len(population)
+        data = inputs[np.arange(rows) % len(inputs)].reshape(len(population), -1, inputs.shape[1])
+        for i in range(len(population.weights) - 1):
+            data = 1 / (1 + np.exp(-(np.matmul(data, population.weights[i]) + population.biases[i][:, None, :])))
+            peaks.append(np.abs(data).max(axis=(0, 1)))
+        return cls(population, [np.maximum(peak, 1e-12) / QUANT_MAX for peak in peaks])
+
+    def __len__(self) -> int:
+        return self.weights[0].shape[0]
+
+    def run(self, data) -> np.ndarray:
+        """Runs data through every quantized network at once. Same interface as Population.run.
+
+        Args:
+            data (array-like): either a single input row shared by every network or one input row per network, shape
+            (N, INPUT_NODES).
+
+        Returns:
+            np.ndarray: float32 array of shape (N, OUTPUT_NODES) holding the output of each network.
+        """
+        data = np.asarray(data, dtype=np.float32)
+        if data.ndim == 1:
+            data = np.broadcast_to(data, (len(self), data.shape[0]))
+        for i in range(len(self.weights)):
+            quantized = np.clip(np.rint(data / self.input_scales[i]), -QUANT_MAX, QUANT_MAX).astype(np.int32)
+            # numpy has no int8 matmul that accumulates in int32, so the int8 weights are widened for the product
+            totals = np.matmul(quantized[:, None, :], self.weights[i].astype(np.int32))[:, 0, :]
+            data = totals * self.weight_scales[i] + self.biases[i]
+            if i != len(self.weights) - 1:
+                data = 1 / (1 + np.exp(-data))
+        return data
+
+
+def collect_inputs(population: Population, bank: TrajectoryBank, trials) -> np.ndarray:
+    """Plays bank trials like do_bank_trial and returns every input row the networks were given: the ball's x, y,
+    velocities and the network's paddle center.
+
+    Args:
+        population (Population): networks to play the trials with
+        bank (TrajectoryBank): bank holding the trials
+        trials (iterable): which trials to play
+
+    Returns:
+        np.ndarray: (M, 5) array of inputs
+    """
+    inputs = []
+    for trial_num in trials:
+        frames = bank.frames[bank.offsets[trial_num]:bank.offsets[trial_num + 1]]
+        paddles = np.full(len(population), bank.start_paddles[trial_num])
+        for frame in frames:
+            inp = np.empty((len(population), 5))
+            inp[:, :4] = frame
+            inp[:, 4] = paddles + PADDLE_HEIGHT / 2
+            inputs.append(inp)
+            paddles = move_paddles(paddles, population.run(inp))
+    return np.concatenate(inputs)
+
+
+def decisions(outputs: np.ndarray) -> np.ndarray:
+    """Returns the action each (up, down) output pair leads to in move_paddles: -1 up, 1 down or 0 stay."""
+    up = outputs[:, 0] > 0
+    down = outputs[:, 1] > 0
+    return (down & ~up).astype(int) - (up & ~down).astype(int)
+
+
+def ranks(scores: np.ndarray) -> np.ndarray:
+    """Returns the rank of every score, 0 for the best. Tied scores get consecutive ranks in index order."""
+    return np.argsort(np.argsort(-scores, kind='stable'), kind='stable')
+
+
+def agreement_report(population: Population, bank: TrajectoryBank, calibration_trials: int = CALIBRATION_TRIALS,
+                     report_trials: int = REPORT_TRIALS) -> dict:
+    """Compares float32 and int8 inference against the float64 reference. The int8 scales are calibrated on the first
+    calibration_trials trials of the bank and the comparison uses the report_trials trials after them.
+
+    Args:
+        population (Population): networks to compare
+        bank (TrajectoryBank): bank holding the trials
+        calibration_trials (int, optional): trials to calibrate on. Defaults to CALIBRATION_TRIALS.
+        report_trials (int, optional): trials to compare on. Defaults to REPORT_TRIALS.
+
+    Returns:
+        dict: for every precision, the fraction of the reference's inputs it makes the same decision on, the mean
+        absolute difference of its rewards from the reference's, the rank correlation of the networks' total rewards
+        with the reference's (1 when selection would pick the same networks), the time of one batched run and the bytes its parameters take
+    """
+    reference = population.astype(np.float64)
+    models = {
+        'float64': reference,
+        'float32': population.astype(np.float32),
+        'int8': QuantizedPopulation.calibrate(reference, collect_inputs(reference, bank, range(calibration_trials))),
+    }
+    trials = range(calibration_trials, calibration_trials + report_trials)
+    inputs = collect_inputs(reference, bank, trials).reshape(-1, len(population), 5)
+    reference_decisions = np.concatenate([decisions(reference.run(inp)) for inp in inputs])
+    reference_rewards = np.array([do_bank_trial(reference, bank, trial) for trial in trials])
+    reference_ranks = ranks(reference_rewards.sum(axis=0))
+
+    report = {}
+    for name, model in models.items():
+        model_decisions = np.concatenate([decisions(model.run(inp)) for inp in inputs])
+        rewards = np.array([do_bank_trial(model, bank, trial) for trial in trials])
+        start = time.perf_counter()
+        for inp in inputs[:100]:
+            model.run(inp)
+        run_time = (time.perf_counter() - start) / len(inputs[:100])
+        if name == 'int8':
+            size = sum(w.nbytes for w in model.weights) + sum(s.nbytes for s in model.weight_scales) + \
+                sum(b.nbytes for b in model.biases)
+        else:
+            size = model.genomes.nbytes
+        report[name] = {
+            'decision_agreement': float(np.mean(model_decisions == reference_decisions)),
+            'reward_error': float(np.mean(np.abs(rewards - reference_rewards))),
+            'rank_correlation': float(np.corrcoef(ranks(rewards.sum(axis=0)), reference_ranks)[0, 1]),
+            'run_time': run_time,
+            'bytes': int(size),
+        }
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare float32 and int8 inference against float64.')
+    parser.add_argument('network', nargs='?',
+                        help='pickled network to compare, copied into every row of the population (default: a random '
+                             'population)')
+    parser.add_argument('--agents', type=int, default=200, help='networks in the population (default: 200)')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the random population (default: 0)')
+    args = parser.parse_args()
+
+    if args.network is not None:
+        with open(args.network, 'rb') as f:
+            population = Population([pickle.load(f)] * args.agents)
+    else:
+        population = Population.random(args.agents, np.random.default_rng(args.seed))
+    np.seterr(over='ignore')  # the sigmoid overflows to exactly 0 or 1 for large inputs, which is expected
+    # a small bank, kept in memory rather than in the trainer's cache so the trainer's bank is never replaced
+    bank = TrajectoryBank.load_or_generate(None, CALIBRATION_TRIALS + REPORT_TRIALS,
+                                           TRAJECTORY_SEED if TRAJECTORY_SEED is not None else 0)
+    report = agreement_report(population, bank)
+    print(f'{"precision":<10}{"decisions":>12}{"reward err":>12}{"rank corr":>12}{"run (us)":>12}{"bytes":>10}')
+    for name, row in report.items():
+        print(f'{name:<10}{row["decision_agreement"]:>12.4%}{row["reward_error"]:>12.2e}{row["rank_correlation"]:>12.4f}'
+              f'{row["run_time"] * 1e6:>12.1f}{row["bytes"]:>10}')
+    sys.stdout.flush()
@@ -0,0 +1,338 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')  # pong.py imports pygame, but nothing is ever drawn here
+from nn import Population
+from pong import (BALL_MAX_ANGLE, BALL_RADIUS, BALL_START_ANGLE, BALL_START_SPEED, PADDLE_DIST_FROM_EDGE,
+                  PADDLE_HEIGHT, PADDLE_SPEED, PADDLE_WIDTH, SCREEN_HEIGHT, SCREEN_WIDTH)
+from headless_pong import MAX_POINTS, MAX_RALLY_HITS, POINTS_TO_WIN
+
+# self-play tournaments: networks play each other in matches with pong.py's full two paddle rules (the ball bounces off
+# either paddle at an angle depending on where it hits), and are rated with Elo. Every match of a tournament is played
+# at once, with the ball, paddles and score of every match stored in numpy arrays.
+SELF_PLAY_ROUNDS = 8  # rounds of a sampled tournament. Every network plays one match per round.
+ELO_START = 1500  # rating every network starts with
+ELO_K = 32  # how far one match can move a rating
+
+LEFT_X = PADDLE_DIST_FROM_EDGE + PADDLE_WIDTH  # x coordinate of the left paddle's front
+RIGHT_X = SCREEN_WIDTH - PADDLE_DIST_FROM_EDGE - PADDLE_WIDTH  # x coordinate of the right paddle's front
+
+
+class BatchedPong:
+    def __init__(self, num_matches: int, rng: np.random.Generator):
+        """Many games of pong.py played side by side. Every array holds one value per match.
+
+        Args:
+            num_matches (int): how many matches to play
+            rng (np.random.Generator): where the serves' random numbers come from
+        """
+        self.rng = rng
+        self.x = np.empty(num_matches)
+        self.y = np.empty(num_matches)
+        self.x_velocity = np.empty(num_matches)
+        self.y_velocity = np.empty(num_matches)
+        self.left_y = np.empty(num_matches)  # top of the left paddle
+        self.right_y = np.empty(num_matches)  # top of the right paddle
+        self.serve(np.ones(num_matches, dtype=bool))
+
+    def serve(self, matches: np.ndarray):
+        """Starts a new point in matches like pong.py does after a point: a centered ball with a random velocity
+        (Ball.randomize_start_vel) and centered paddles.
+
+        Args:
+            matches (np.ndarray): boolean mask of the matches to serve in
+        """
+        count = int(matches.sum())
+        angle = self.rng.integers(-BALL_START_ANGLE, BALL_START_ANGLE, endpoint=True, size=count).astype(float)
+        angle[self.rng.random(count) < .5] += 180
+        angle = np.radians(angle)
+        self.x[matches] = SCREEN_WIDTH / 2
+        self.y[matches] = SCREEN_HEIGHT / 2
+        self.x_velocity[matches] = BALL_START_SPEED * np.cos(angle)
+        self.y_velocity[matches] = BALL_START_SPEED * np.sin(angle)
+        self.left_y[matches] = SCREEN_HEIGHT / 2 - PADDLE_HEIGHT / 2
+        self.right_y[matches] = SCREEN_HEIGHT / 2 - PADDLE_HEIGHT / 2
+
+    def keep(self, matches: np.ndarray):
+        """Drops every match not in the boolean mask matches."""
+        for name in ('x', 'y', 'x_velocity', 'y_velocity', 'left_y', 'right_y'):
+            setattr(self, name, getattr(self, name)[matches])
+
+    def inputs(self) -> np.ndarray:
+        """Returns the inputs of every left player followed by every right player, shape (2 * matches, 5). Right
+        players see the game mirrored, like headless_pong.NetworkPlayer, since networks are trained on the left."""
+        left = np.stack([self.x, self.y, self.x_velocity, self.y_velocity, self.left_y + PADDLE_HEIGHT / 2], axis=1)
+        right = np.stack([SCREEN_WIDTH - self.x, self.y, -self.x_velocity, self.y_velocity,
+                          self.right_y + PADDLE_HEIGHT / 2], axis=1)
+        return np.concatenate([left, right])
+
+    @staticmethod
+    def move(paddles: np.ndarray, outputs: np.ndarray) -> np.ndarray:
+        """Moves paddles like Paddle.move_up and Paddle.move_down, for the networks' (up, down) outputs."""
+        up = outputs[:, 0] > 0
+        down = outputs[:, 1] > 0
+        paddles = np.where(up & ~down, np.maximum(paddles - PADDLE_SPEED, 0), paddles)
+        return np.where(down & ~up, np.minimum(paddles + PADDLE_SPEED, SCREEN_HEIGHT - PADDLE_HEIGHT), paddles)
+
+    def step(self, outputs: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Plays one frame of every match: the paddles move, then the ball moves like pong.py's Ball.update.
+
+        Args:
+            outputs (np.ndarray): network outputs for the players in inputs' order, shape (2 * matches, 2)
+
+        Returns:
+            tuple[np.ndarray, np.ndarray]: who scored in every match (1 for left, -1 for right, 0 for nobody) and
+            whether the ball was hit
+        """
+        num = len(self.x)
+        self.left_y = self.move(self.left_y, outputs[:num])
+        self.right_y = self.move(self.right_y, outputs[num:])
+
+        # same conditions as Ball.update. The side is decided before the collision changes the ball's velocity.
+        reaching = ((self.x + self.x_velocity + BALL_RADIUS >= RIGHT_X) |
+                    (self.x + self.x_velocity - BALL_RADIUS <= LEFT_X)) & \
+            (self.x + BALL_RADIUS <= RIGHT_X) & (self.x - BALL_RADIUS >= LEFT_X)
+        right_side = reaching & (self.x + self.x_velocity + BALL_RADIUS >= RIGHT_X)
+        slope = self.y_velocity / self.x_velocity
+        # Ball.collision_right and Ball.collision_left
+        collision_y = np.where(right_side, self.y + slope * (RIGHT_X - (self.x + BALL_RADIUS)),
+                               self.y + slope * (LEFT_X - (self.x - BALL_RADIUS)))
+        paddle_y = np.where(right_side, self.right_y, self.left_y)
+        on_paddle = (collision_y + BALL_RADIUS > paddle_y) & (collision_y - BALL_RADIUS < paddle_y + PADDLE_HEIGHT)
+        hit = reaching & on_paddle
+        scored = np.where(reaching & ~on_paddle, np.where(right_side, 1, -1), 0)
+
+        offset = (paddle_y + PADDLE_HEIGHT / 2 - collision_y) / (PADDLE_HEIGHT / 2 + BALL_RADIUS) * \
+            np.radians(BALL_MAX_ANGLE)
+        angle = np.where(right_side, np.pi + offset, -offset)
+        self.x_velocity = np.where(hit, BALL_START_SPEED * np.cos(angle), self.x_velocity)
+        self.y_velocity = np.where(hit, BALL_START_SPEED * np.sin(angle), self.y_velocity)
+        self.x = np.where(hit, np.where(right_side, RIGHT_X - BALL_RADIUS, LEFT_X + BALL_RADIUS), self.x)
+        self.y = np.where(hit, collision_y, self.y)
+        # how much the ball will have moved when it hits a paddle
+        moved_proportion = np.where(hit, np.where(right_side, RIGHT_X - (self.x + BALL_RADIUS),
+                                                  (self.x - BALL_RADIUS) - LEFT_X) / self.x_velocity, 0)
+
+        # move the remaining amount, except in matches where someone just scored
+        remaining = np.where(scored == 0, 1 - moved_proportion, 0)
+        self.x = self.x + self.x_velocity * remaining
+        self.y = self.y + self.y_velocity * remaining
+        new_y = np.clip(self.y, BALL_RADIUS, SCREEN_HEIGHT - BALL_RADIUS)
+        # if it bounced off a wall, correct for the rest of the motion
+        bounced = new_y != self.y
+        self.y = np.where(bounced, self.y - 2 * (self.y - new_y), new_y)
+        self.y_velocity = np.where(bounced, -self.y_velocity, self.y_velocity)
+        return scored, hit
+
+
+def play_matches(population: Population, left: np.ndarray, right: np.ndarray, rng: np.random.Generator) -> dict:
+    """Plays every match at once. A match is won by the first player to POINTS_TO_WIN points. Like headless_pong.py,
+    rallies longer than MAX_RALLY_HITS hits are served again without a point, and a match still going after MAX_POINTS
+    points is a draw.
+
+    Args:
+        population (Population): the networks
+        left (np.ndarray): index of the left player of every match
+        right (np.ndarray): index of the right player of every match
+        rng (np.random.Generator): where the serves' random numbers come from
+
+    Returns:
+        dict: 'result' of every match (1 if left won, -1 if right won, 0 for a draw), each side's points, and the
+        number of frames played
+    """
+    num_matches = len(left)
+    left_points = np.zeros(num_matches, dtype=int)
+    right_points = np.zeros(num_matches, dtype=int)
+    points_played = np.zeros(num_matches, dtype=int)
+    game = BatchedPong(num_matches, rng)
+    live = np.arange(num_matches)  # matches still being played, in the order the game holds them
+    hits = np.zeros(num_matches, dtype=int)  # hits of each live match's current rally
+    genomes = population.genomes[np.concatenate([left, right])]
+    frames = 0
+    while len(live) > 0:
+        players = Population.from_genomes(genomes, population.layer_sizes)
+        scored, hit = game.step(players.run(game.inputs()))
+        frames += len(live)
+        hits += hit
+        left_points[live] += scored == 1
+        right_points[live] += scored == -1
+        point_over = (scored != 0) | (hits >= MAX_RALLY_HITS)
+        points_played[live] += point_over
+        over = (np.maximum(left_points[live], right_points[live]) >= POINTS_TO_WIN) | \
+            (points_played[live] >= MAX_POINTS)
+        game.serve(point_over & ~over)
+        hits[point_over] = 0
+        if over.any():
+            game.keep(~over)
+            genomes = genomes[np.concatenate([~over, ~over])]
+            hits = hits[~over]
+            live = live[~over]
+    result = np.where(left_points >= POINTS_TO_WIN, 1, np.where(right_points >= POINTS_TO_WIN, -1, 0))
+    return {'result': result, 'left_points': left_points, 'right_points': right_points, 'frames': frames}
+
+
+def sampled_rounds(num_agents: int, num_rounds: int, rng: np.random.Generator) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Pairs every network with a random opponent, num_rounds times. With an odd number of networks a random one sits
+    each round out.
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray]]: the left and right players of every round's matches
+    """
+    rounds = []
+    for _ in range(num_rounds):
+        order = rng.permutation(num_agents)[:num_agents // 2 * 2]
+        rounds.append((order[0::2], order[1::2]))
+    return rounds
+
+
+def round_robin_rounds(num_agents: int) -> list[tuple[np.ndarray, np.ndarray]]:
+    """Pairs every network with every other network once, using the circle method: num_agents - 1 rounds (num_agents
+    with an odd number of networks, each one sitting out once) in which every network plays at most one match. Sides
+    alternate between rounds.
+
+    Returns:
+        list[tuple[np.ndarray, np.ndarray]]: the left and right players of every round's matches
+    """
+    slots = num_agents + num_agents % 2  # an odd number of networks gets a bye, slot num_agents
+    circle = np.arange(slots)
+    rounds = []
+    for round_num in range(slots - 1):
+        first, second = circle[:slots // 2], circle[slots // 2:][::-1]
+        if round_num % 2 == 1:
+            first, second = second, first
+        playing = (first < num_agents) & (second < num_agents)
+        rounds.append((first[playing], second[playing]))
+        # keep the first slot fixed and rotate the rest
+        circle = np.concatenate([circle[:1], np.roll(circle[1:], 1)])
+    return rounds
+
+
+# pairing schedules by name
+SCHEDULES = {'sampled': sampled_rounds, 'round_robin': round_robin_rounds}
+
+
+def elo_update(ratings: np.ndarray, left: np.ndarray, right: np.ndarray, result: np.ndarray) -> np.ndarray:
+    """Updates Elo ratings for one round of matches, in which every network plays at most once.
+
+    Args:
+        ratings (np.ndarray): every network's rating
+        left (np.ndarray): left player of every match
+        right (np.ndarray): right player of every match
+        result (np.ndarray): 1 if left won, -1 if right won, 0 for a draw
+
+    Returns:
+        np.ndarray: the new ratings
+    """
+    expected = 1 / (1 + 10 ** ((ratings[right] - ratings[left]) / 400))
+    change = ELO_K * ((result + 1) / 2 - expected)
+    ratings = ratings.copy()
+    np.add.at(ratings, left, change)
+    np.add.at(ratings, right, -change)
+    return ratings
+
+
+def tournament(population: Population, rng: np.random.Generator, schedule: str = 'sampled',
+               num_rounds: int = SELF_PLAY_ROUNDS, ratings: np.ndarray = None) -> tuple[np.ndarray, dict]:
+    """Plays a self-play tournament and rates every network. Every round's matches are played in the same batch, and
+    the ratings are then updated round by round.
+
+    Args:
+        population (Population): the networks
+        rng (np.random.Generator): random number generator for pairing and serves
+        schedule (str, optional): a key of SCHEDULES. Defaults to 'sampled'.
+        num_rounds (int, optional): rounds of a sampled tournament. Defaults to SELF_PLAY_ROUNDS.
+        ratings (np.ndarray, optional): ratings to start from. Defaults to ELO_START for every network.
+
+    Returns:
+        tuple[np.ndarray, dict]: every network's rating, and the tournament's number of matches, results and frames
+        played
+    """
+    if schedule == 'sampled':
+        rounds = sampled_rounds(len(population), num_rounds, rng)
+    else:
+        rounds = SCHEDULES[schedule](len(population))
+    left = np.concatenate([round_left for round_left, _ in rounds])
+    right = np.concatenate([round_right for _, round_right in rounds])
+    matches = play_matches(population, left, right, rng)
+
+    ratings = np.full(len(population), float(ELO_START)) if ratings is None else np.array(ratings, dtype=float)
+    start = 0
+    for round_left, round_right in rounds:
+        end = start + len(round_left)
+        ratings = elo_update(ratings, round_left, round_right, matches['result'][start:end])
+        start = end
+    return ratings, {'matches': len(left), 'left_wins': int(np.sum(matches['result'] == 1)),
+                     'right_wins': int(np.sum(matches['result'] == -1)), 'draws': int(np.sum(matches['result'] == 0)),
+                     'frames': matches['frames']}
+
+
+class SelfPlayEvaluator:
+    def __init__(self, rng: np.random.Generator, schedule: str = 'sampled', num_rounds: int = SELF_PLAY_ROUNDS):
+        """Scores generations with a self-play tournament instead of trials. Has the same submit, collect, evaluate and
+        close methods and metrics as ai_pong.Evaluator, so the trainer can use either one.
+
+        Args:
+            rng (np.random.Generator): random number generator for pairing and serves
+            schedule (str, optional): a key of SCHEDULES. Defaults to 'sampled'.
+            num_rounds (int, optional): rounds of a sampled tournament. Defaults to SELF_PLAY_ROUNDS.
+        """
+        self.rng = rng
+        self.schedule = schedule
+        self.num_rounds = num_rounds
+        self.cache = None  # ratings depend on the opponents, so there is no fitness cache
+        self.pending = None  # the networks passed to submit, until collect returns their ratings
+        self.metrics = {}  # timings and counts of the last call to collect
+
+    def submit(self, games: Population):
+        """Remembers the networks to rate. The tournament is played in collect, since it runs in this process."""
+        self.pending = games
+
+    def collect(self) -> np.ndarray:
+        """Plays a tournament between the networks passed to submit.
+
+        Returns:
+            np.ndarray: each network's Elo rating
+        """
+        games = self.pending
+        self.pending = None
+        start = time.perf_counter()
+        ratings, stats = tournament(games, self.rng, self.schedule, self.num_rounds)
+        seconds = time.perf_counter() - start
+        self.metrics = {
+            'timings': {'evaluation': seconds},
+            'evaluated': len(games),
+            'matches': stats['matches'],
+            'draws': stats['draws'],
+            'match_frames_per_second': stats['frames'] / seconds if seconds > 0 else 0.0,
+        }
+        return ratings
+
+    def evaluate(self, games: Population) -> np.ndarray:
+        """Rates every network in games, see submit and collect."""
+        self.submit(games)
+        return self.collect()
+
+    def close(self):
+        pass  # nothing to shut down
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rate networks with a self-play tournament.')
+    parser.add_argument('--agents', type=int, default=1000, help='random networks to rate (default: 1000)')
+    parser.add_argument('--schedule', choices=SCHEDULES, default='sampled', help='pairing schedule (default: sampled)')
+    parser.add_argument('--rounds', type=int, default=SELF_PLAY_ROUNDS,
+                        help=f'rounds of a sampled tournament (default: {SELF_PLAY_ROUNDS})')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the networks, pairings and serves (default: 0)')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    population = Population.random(args.agents, rng)
+    start = time.time()
+    ratings, stats = tournament(population, rng, args.schedule, args.rounds)
+    elapsed = time.time() - start
+    print(f'{stats["matches"]} matches in {elapsed:.2f}s ({stats["frames"] / elapsed:.0f} match frames per second)')
+    print(f'left wins: {stats["left_wins"]}, right wins: {stats["right_wins"]}, draws: {stats["draws"]}')
+    print(f'ratings: best {ratings.max():.0f}, median {np.median(ratings):.0f}, worst {ratings.min():.0f}')
+    sys.stdout.flush()
@@ -0,0 +1,84 @@
+from multiprocessing import shared_memory
+import numpy as np
+from nn import DTYPE, Population, genome_length, layer_sizes_from_constants
+
+
+def shared_array(shape: tuple, dtype, name: str = None) -> tuple[shared_memory.SharedMemory, np.ndarray]:
+    """Creates (or attaches to, if name is given) a numpy array backed by a shared memory block.
+
+    Args:
+        shape (tuple): shape of the array
+        dtype: numpy dtype of the array
+        name (str, optional): name of an existing block to attach to. Defaults to None, which creates a new block.
+
+    Returns:
+        tuple[shared_memory.SharedMemory, np.ndarray]: the shared memory block (keep a reference to it for as long as
+        the array is used) and the array.
+    """
+    size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+    shm = shared_memory.SharedMemory(name=name, create=name is None, size=size)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+class SharedPopulation(Population):
+    def __init__(self, num_agents: int, name: str = None):
+        """Population whose genome array lives in a shared memory block, so pool workers can attach to it once and
+        read every new generation without anything being pickled.
+
+        Args:
+            num_agents (int): number of networks in the population
+            name (str, optional): name of an existing block to attach to. Defaults to None, which creates a new block.
+        """
+        layer_sizes = layer_sizes_from_constants()
+        shape = (num_agents, genome_length(layer_sizes))
+        # the first 16 bytes hold the version number of the generation currently stored in the block and how many of
+        # the num_agents rows it uses
+        self.shm = shared_memory.SharedMemory(name=name, create=name is None,
+                                              size=16 + int(np.prod(shape)) * np.dtype(DTYPE).itemsize)
+        self.header = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)
+        self.set_genomes(np.ndarray(shape, dtype=DTYPE, buffer=self.shm.buf, offset=16), layer_sizes)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def version(self) -> int:
+        return int(self.header[0])
+
+    @property
+    def count(self) -> int:
+        return int(self.header[1])
+
+    def active(self) -> Population:
+        """Returns the networks loaded by the last call to load, as a Population viewing the shared block."""
+        return Population.from_genomes(self.genomes[:self.count], self.layer_sizes)
+
+    def load(self, networks, version: int):
+        """Copies a new generation of networks into the shared block.
+
+        Args:
+            networks (Population | list[NeuralNetwork]): the new generation. May have fewer than num_agents networks.
+            version (int): version number workers use to check they are reading this generation
+        """
+        if not isinstance(networks, Population):
+            networks = Population(networks)
+        self.genomes[:len(networks)] = networks.genomes
+        self.header[1] = len(networks)
+        # written last so a worker that sees the new version also sees the new weights
+        self.header[0] = version
+
+    def close(self, unlink: bool = False):
+        """Detaches from the shared block. The process that created the block should also unlink it.
+
+        Args:
+            unlink (bool, optional): free the block once every process has closed it. Defaults to False.
+        """
+        # drop the views into the buffer before closing it
+        self.genomes = None
+        self.weights = []
+        self.biases = []
+        self.header = None
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
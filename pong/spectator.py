@@ -0,0 +1,74 @@
+import os
+import sys
+# modules shared by both games, like spectator_process.py, live in common/
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))
+from policy import build_policy
+from spectator_process import SPECTATOR_FPS, newest
+
+# watch training live. watch_pong runs in a spectator_process.Spectator and plays whichever champion the trainer sent it
+# last in a pong.py window.
+SPECTATOR_OPPONENT = 'predict'  # scripted player on the right side, see headless_pong.SCRIPTED_PLAYERS
+
+
+def watch_pong(snapshots, fps: int = SPECTATOR_FPS):
+    """Spectator process playing pong.py with the newest snapshot as the left player against SPECTATOR_OPPONENT. A new
+    snapshot takes over at the next serve.
+
+    Args:
+        snapshots (multiprocessing.Queue): queue the snapshots arrive on
+        fps (int, optional): frames per second of the window. Defaults to SPECTATOR_FPS.
+    """
+    # pygame is only imported in the spectator process, so the trainer never opens a display
+    import pygame
+    from pong import BACKGROUND_COLOR, SCREEN_HEIGHT, SCREEN_WIDTH, Ball, Paddle
+    from headless_pong import NetworkPlayer, make_player
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption('Pong spectator: waiting for the first champion')
+    clock = pygame.time.Clock()
+
+    left = None
+    right = make_player(SPECTATOR_OPPONENT, 'r')
+    pending = None  # newest snapshot, until the next serve
+    serve = True  # whether the ball was just served, so the players can be switched
+    ball = Ball()
+    left_paddle = Paddle('l')
+    right_paddle = Paddle('r')
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                return
+
+        latest = newest(snapshots)
+        if latest is not None:
+            pending = latest
+        if pending is not None and serve:
+            layer_sizes, params, label = pending
+            left = NetworkPlayer(build_policy(layer_sizes, 'sigmoid', params), 'l')
+            pending = None
+            score = {'l': 0, 'r': 0}
+            pygame.display.set_caption(f'Pong spectator: {label} (0 - 0 vs {SPECTATOR_OPPONENT})')
+        if left is None:
+            # nothing to show until the first snapshot arrives
+            clock.tick(fps)
+            continue
+
+        left.move(ball, left_paddle, left_paddle, right_paddle)
+        right.move(ball, right_paddle, left_paddle, right_paddle)
+        scorer = ball.update(left_paddle, right_paddle)
+        serve = scorer is not None
+        if serve:
+            score[scorer] += 1
+            pygame.display.set_caption(f'Pong spectator: {label} ({score["l"]} - {score["r"]} vs {SPECTATOR_OPPONENT})')
+            ball = Ball()
+            left_paddle = Paddle('l')
+            right_paddle = Paddle('r')
+
+        screen.fill(BACKGROUND_COLOR)
+        ball.draw(screen)
+        left_paddle.draw(screen)
+        right_paddle.draw(screen)
+        pygame.display.flip()
+        clock.tick(fps)
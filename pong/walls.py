@@ -0,0 +1,29 @@
+# wall bounces of a ball flying in a straight line. Shared by pong.py (Ball.predict_collision) and ai_pong.py (BallFlight
+# and the trajectory bank), so both always fold a flight the same way.
+
+
+def fold_y(y, y_velocity, screen_height: float, ball_radius: float) -> tuple:
+    """Folds the y coordinate of a ball flying in a straight line (ignoring walls) back onto the screen, as if it had
+    bounced off the top and bottom walls on the way. Works on floats and numpy arrays.
+
+    Args:
+        y (float | np.ndarray): unbounded y coordinate
+        y_velocity (float | np.ndarray): y velocity the ball started flying with
+        screen_height (float): height of the screen
+        ball_radius (float): radius of the ball
+
+    Returns:
+        tuple: the folded y coordinate and the y direction after bouncing (1 if unchanged, -1 if flipped)
+    """
+    span = screen_height - 2 * ball_radius
+    spans = (y - ball_radius) / span
+    # only operators, so it is as fast on floats as plain Python and works on arrays too. Ceilings and floors come from
+    # floor division by 1, and values are picked by multiplying with conditions, both of which are exact.
+    moving_down = y_velocity > 0
+    # like Ball.update, a ball exactly touching a wall has not bounced off it yet
+    bounces = moving_down * (-(-spans // 1) - 1) + (1 - moving_down) * -(spans // 1)
+    bounces = bounces * (bounces > 0)
+    distance = (y - ball_radius) % (2 * span)
+    past_span = distance > span
+    folded = past_span * (2 * span - distance) + (1 - past_span) * distance + ball_radius
+    return folded, 1 - 2 * (bounces % 2)